@@ -0,0 +1,156 @@
+"""User-defined price alerts (``/alert SGD USD > 0.79``).
+
+Rules are kept per currency pair in two sorted threshold lists, one for
+``>`` rules and one for ``<`` rules, ordered so that the rules a rate fires
+are always a suffix of the list. Checking a pair against a new rate is
+therefore one ``bisect`` plus the rules that fire (which are removed, so an
+alert fires once), however many rules exist. Rules are persisted to
+``ALERTS_FILE`` and the index is rebuilt from it on startup.
+"""
+import os
+import json
+import bisect
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+ALERTS_FILE = os.environ.get("ALERTS_FILE", "alerts.json")
+OPS = (">", "<")
+
+
+class _PairIndex:
+    """Sorted thresholds for one pair. ``>`` rules are stored by negated
+    threshold so that, for both directions, fired rules sit at the end."""
+
+    def __init__(self):
+        self.keys = {">": [], "<": []}  # sort keys, ascending
+        self.ids = {">": [], "<": []}  # rule ids, parallel to keys
+
+    @staticmethod
+    def _key(op, threshold):
+        return -threshold if op == ">" else threshold
+
+    def add(self, op, threshold, rule_id):
+        key = self._key(op, threshold)
+        i = bisect.bisect_right(self.keys[op], key)
+        self.keys[op].insert(i, key)
+        self.ids[op].insert(i, rule_id)
+
+    def remove(self, op, threshold, rule_id):
+        key = self._key(op, threshold)
+        lo = bisect.bisect_left(self.keys[op], key)
+        hi = bisect.bisect_right(self.keys[op], key)
+        i = self.ids[op].index(rule_id, lo, hi)
+        del self.keys[op][i]
+        del self.ids[op][i]
+
+    def pop_fired(self, rate):
+        """Removes and returns the ids of every rule ``rate`` satisfies."""
+        fired = []
+        # rate > threshold  <=>  -threshold > -rate
+        for op, key in ((">", -rate), ("<", rate)):
+            i = bisect.bisect_right(self.keys[op], key)
+            fired.extend(self.ids[op][i:])
+            del self.keys[op][i:]
+            del self.ids[op][i:]
+        return fired
+
+    def __len__(self):
+        return len(self.ids[">"]) + len(self.ids["<"])
+
+
+class AlertBook:
+    def __init__(self, path=ALERTS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.rules = {}  # id -> rule dict
+        self._index = {}  # (from, to) -> _PairIndex
+        self._next_id = 1
+        self._load()
+
+    # --------------- Persistence ---------------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read alerts from {self.path}: {e}")
+            return
+        for rule in state.get("rules", []):
+            self._insert(rule)
+        self._next_id = max(state.get("next_id", 1), max(self.rules, default=0) + 1)
+
+    def _save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"next_id": self._next_id, "rules": list(self.rules.values())}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    # --------------- Rules ---------------
+
+    def _insert(self, rule):
+        self.rules[rule["id"]] = rule
+        pair = (rule["from"], rule["to"])
+        self._index.setdefault(pair, _PairIndex()).add(rule["op"], rule["threshold"], rule["id"])
+
+    def add(self, chat_id, from_ccy, to_ccy, op, threshold):
+        if op not in OPS:
+            raise ValueError(f"Operator must be one of {' '.join(OPS)}")
+        with self._lock:
+            rule = {
+                "id": self._next_id,
+                "chat_id": chat_id,
+                "from": from_ccy.upper(),
+                "to": to_ccy.upper(),
+                "op": op,
+                "threshold": float(threshold),
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            self._next_id += 1
+            self._insert(rule)
+            self._save()
+            return rule
+
+    def remove(self, rule_id, chat_id=None):
+        """Deletes a rule; returns it, or None if no such rule (for this chat)."""
+        with self._lock:
+            rule = self.rules.get(rule_id)
+            if rule is None or (chat_id is not None and rule["chat_id"] != chat_id):
+                return None
+            self._index[(rule["from"], rule["to"])].remove(rule["op"], rule["threshold"], rule_id)
+            del self.rules[rule_id]
+            self._save()
+            return rule
+
+    def for_chat(self, chat_id):
+        with self._lock:
+            return [r for r in self.rules.values() if r["chat_id"] == chat_id]
+
+    def pairs(self):
+        """Pairs with at least one active rule."""
+        with self._lock:
+            return [pair for pair, idx in self._index.items() if len(idx)]
+
+    def check(self, rate_of):
+        """Fires every rule satisfied by the current rates. ``rate_of(from,
+        to)`` returns the rate or None. Fired rules are removed and returned,
+        each with the ``rate`` that triggered it."""
+        fired = []
+        with self._lock:
+            for (from_ccy, to_ccy), idx in self._index.items():
+                if not len(idx):
+                    continue
+                rate = rate_of(from_ccy, to_ccy)
+                if rate is None:
+                    continue
+                for rule_id in idx.pop_fired(rate):
+                    rule = self.rules.pop(rule_id)
+                    fired.append(dict(rule, rate=rate))
+            if fired:
+                self._save()
+        return fired
@@ -1,82 +1,84 @@
-import os
-import json
-import base64
+import bisect
 from datetime import datetime, timedelta
-import gspread
-from google.oauth2.service_account import Credentials
 from dotenv import load_dotenv
-import yfinance as yf
 
-load_dotenv()
+import quotes
+import sheets
+import writequeue
 
-GOOGLE_SHEET_ID = os.environ["GOOGLE_SHEET_ID"]
+load_dotenv()
 
-def get_gsheet():
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    service_account_b64 = os.environ["GOOGLE_SERVICE_ACCOUNT"]
-    service_account_info = json.loads(base64.b64decode(service_account_b64))
-    creds = Credentials.from_service_account_info(service_account_info, scopes=scopes)
-    gc = gspread.authorize(creds)
-    return gc.open_by_key(GOOGLE_SHEET_ID)
-
-def ensure_trades_sheet(sp):
-    try:
-        ws = sp.worksheet("Trades")
-    except gspread.exceptions.WorksheetNotFound:
-        ws = sp.add_worksheet(title="Trades", rows=1000, cols=10)
-        ws.append_row([
-            "Date", "From", "To", "Amount", "Rate",
-            "Converted", "Notes", "Market Rate", "Spread %",
-        ])
-    return ws
+BACKFILL_SPOOL = "backfill_spool.jsonl"
 
 TRADES = [
 ## fill in your trades here
 ]
 
-def get_historical_rate(from_ccy, to_ccy, date_str):
-    ticker = f"{from_ccy}{to_ccy}=X"
-    trade_date = datetime.strptime(date_str[:10], "%Y-%m-%d")
-    try:
-        df = yf.download(
-            ticker,
-            start=(trade_date.strftime("%Y-%m-%d")),
-            end=((trade_date + timedelta(days=5)).strftime("%Y-%m-%d")),
-            interval="1d",
-            progress=False,
-        )
-        s = df["Close"]
-        if hasattr(s, "columns"):
-            s = s.iloc[:, 0]
-        s = s.dropna()
-        if not s.empty:
-            return float(s.iloc[0])
-    except Exception as e:
-        print(f"  Could not fetch historical rate for {ticker} on {date_str[:10]}: {e}")
-    return None
+def _trade_date(date_str):
+    return datetime.strptime(date_str[:10], "%Y-%m-%d").date()
+
+
+def build_rate_index(trades):
+    """Downloads every traded ticker's daily closes over the whole backfill
+    range in one batched request. Returns ``{ticker: (dates, closes)}`` with
+    dates sorted ascending, ready for binary search."""
+    if not trades:
+        return {}
+    tickers = {f"{t['from']}{t['to']}=X" for t in trades}
+    dates = [_trade_date(t["date"]) for t in trades]
+    # Start a week early so trades on weekends/holidays still have a prior close.
+    start = (min(dates) - timedelta(days=7)).strftime("%Y-%m-%d")
+    end = (max(dates) + timedelta(days=1)).strftime("%Y-%m-%d")
+    closes = quotes.download_closes(tickers, start=start, end=end)
+    index = {}
+    for ticker in tickers:
+        s = closes[ticker].dropna() if ticker in closes else None
+        if s is None or s.empty:
+            print(f"  No historical data for {ticker} between {start} and {end}")
+            index[ticker] = ([], [])
+            continue
+        index[ticker] = ([ts.date() for ts in s.index], [float(v) for v in s.values])
+    return index
+
+
+def get_historical_rate(rate_index, from_ccy, to_ccy, date_str):
+    """Close on the trade date, or the nearest trading day before it."""
+    dates, closes = rate_index.get(f"{from_ccy}{to_ccy}=X", ([], []))
+    i = bisect.bisect_right(dates, _trade_date(date_str)) - 1
+    if i < 0:
+        return None
+    return closes[i]
 
 
 def main():
-    sp = get_gsheet()
-    ws = ensure_trades_sheet(sp)
+    queue = writequeue.WriteQueue(path=BACKFILL_SPOOL)
+    if queue.pending():
+        # An interrupted run already computed and spooled these rows; finish
+        # appending them instead of queueing TRADES a second time.
+        print(f"Finishing {len(queue.pending())} rows left in {BACKFILL_SPOOL} by an interrupted run...")
+        queue.drain()
+        print("Done!")
+        return
+    rate_index = build_rate_index(TRADES)
+    rows = []
     for t in TRADES:
-        market_rate = get_historical_rate(t["from"], t["to"], t["date"])
+        market_rate = get_historical_rate(rate_index, t["from"], t["to"], t["date"])
         if market_rate:
             spread_pct = round((t["rate"] - market_rate) / market_rate * 100, 4)
         else:
             market_rate = ""
             spread_pct = ""
-        ws.append_row([
+        rows.append([
             t["date"], t["from"], t["to"], t["amount"], t["rate"],
             t["converted"], t["notes"], market_rate, spread_pct,
         ])
         print(
-            f"Added: {t['amount']} {t['from']} → {t['converted']} {t['to']} @ {t['rate']} "
+            f"Queued: {t['amount']} {t['from']} → {t['converted']} {t['to']} @ {t['rate']} "
             f"({t['date'][:10]}) | market: {market_rate} | spread: {spread_pct}%"
         )
+    queue.enqueue_many(sheets.TRADES_SHEET, rows)
+    print(f"Appending {len(queue.pending())} rows...")
+    queue.drain()
     print("Done!")
 
 if __name__ == "__main__":
@@ -0,0 +1,193 @@
+"""Local stand-ins for ``yf.download`` and the Google Sheets API.
+
+Both replay recorded data when a fixture has it (see ``bench.fixtures``) and
+synthesize a deterministic series otherwise, sleep ``latency`` seconds per
+request to mimic the network, and count every request so the runner can
+report how many external calls an entry point made.
+"""
+import re
+import time
+import threading
+import zlib
+from collections import Counter
+
+import gspread
+import numpy as np
+import pandas as pd
+
+_PERIOD_DAYS = {"d": 1, "wk": 7, "mo": 31, "y": 366}
+
+
+def _period_index(period, interval, start=None, end=None):
+    today = pd.Timestamp.today().normalize()
+    if interval not in ("1d", "1wk", "1mo"):
+        # Intraday: today's bars.
+        step = interval.replace("m", "min")
+        return pd.date_range(end=pd.Timestamp.now().floor(step), periods=78, freq=step)
+    if start is not None:
+        stop = pd.Timestamp(end) - pd.Timedelta(days=1) if end else today
+        return pd.bdate_range(start, stop)
+    m = re.fullmatch(r"(\d+)(d|wk|mo|y)", period or "2mo")
+    days = int(m.group(1)) * _PERIOD_DAYS[m.group(2)] if m else 62
+    return pd.bdate_range(end=today, periods=max(1, days * 5 // 7))
+
+
+class FakeYahoo:
+    """Drop-in for ``yf.download`` returning the same multi-ticker frame shape."""
+
+    def __init__(self, recorded=None, latency=0.0):
+        self.recorded = recorded or {}  # ticker -> DataFrame of Open/High/Low/Close
+        self.latency = latency
+        self.calls = 0
+        self.tickers = 0
+
+    def _bars(self, ticker, index):
+        rec = self.recorded.get(ticker)
+        if rec is not None:
+            rec = rec.reindex(index, method="ffill")
+            if rec["Close"].notna().any():
+                return rec
+        rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+        level = 10 ** rng.uniform(-1, 3)
+        walk = level * np.exp(np.cumsum(rng.normal(0, 0.004, len(index))))
+        spread = walk * rng.uniform(0.001, 0.004, len(index))
+        return pd.DataFrame(
+            {"Open": walk, "High": walk + spread, "Low": walk - spread, "Close": walk}, index=index
+        )
+
+    def download(self, tickers, period=None, interval="1d", start=None, end=None, progress=False, **kwargs):
+        if isinstance(tickers, str):
+            tickers = tickers.split()
+        self.calls += 1
+        self.tickers += len(tickers)
+        if self.latency:
+            time.sleep(self.latency)
+        index = _period_index(period, interval, start, end)
+        frames = {t: self._bars(t, index) for t in tickers}
+        df = pd.concat(frames, axis=1).swaplevel(axis=1).sort_index(axis=1)
+        df.columns.names = ["Price", "Ticker"]
+        df.index.name = "Date"
+        return df
+
+    __call__ = download
+
+
+def _col_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+class FakeWorksheet:
+    """The subset of ``gspread.Worksheet`` the bot, ledger and write queue use.
+    Cells are held as strings, the way the Sheets API returns them."""
+
+    def __init__(self, spreadsheet, title, values=()):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.values = [[str(v) for v in row] for row in values]
+
+    def _call(self, op):
+        self.spreadsheet._call(op)
+
+    @property
+    def row_count(self):
+        return max(1000, len(self.values))
+
+    def get_all_values(self, **kwargs):
+        self._call("get_all_values")
+        return [list(r) for r in self.values]
+
+    def get_all_records(self, **kwargs):
+        self._call("get_all_records")
+        if not self.values:
+            return []
+        header = self.values[0]
+        return [dict(zip(header, r + [""] * (len(header) - len(r)))) for r in self.values[1:]]
+
+    def row_values(self, row, **kwargs):
+        self._call("row_values")
+        return list(self.values[row - 1]) if len(self.values) >= row else []
+
+    def col_values(self, col, **kwargs):
+        self._call("col_values")
+        return [r[col - 1] for r in self.values if len(r) >= col and r[col - 1] != ""]
+
+    def get(self, range_name=None, **kwargs):
+        self._call("get")
+        m = re.fullmatch(r"([A-Z]+)(\d+)?:([A-Z]+)(\d+)?", range_name)
+        first = int(m.group(2) or 1)
+        last = int(m.group(4) or len(self.values))
+        c1, c2 = _col_index(m.group(1)), _col_index(m.group(3))
+        return [r[c1:c2 + 1] for r in self.values[first - 1:last]]
+
+    def append_row(self, row, **kwargs):
+        self._call("append_row")
+        self.values.append([str(v) for v in row])
+
+    def append_rows(self, rows, **kwargs):
+        self._call("append_rows")
+        self.values.extend([str(v) for v in r] for r in rows)
+
+    def find(self, query, in_column=None, **kwargs):
+        self._call("find")
+        col = (in_column or 1) - 1
+        for i, r in enumerate(self.values):
+            if len(r) > col and r[col] == query:
+                return gspread.cell.Cell(i + 1, col + 1, query)
+        return None
+
+    def update_cell(self, row, col, value):
+        self._call("update_cell")
+        while len(self.values) < row:
+            self.values.append([])
+        r = self.values[row - 1]
+        r.extend([""] * (col - len(r)))
+        r[col - 1] = str(value)
+
+    def delete_rows(self, index, end_index=None):
+        self._call("delete_rows")
+        del self.values[index - 1:(end_index or index)]
+
+    def clear(self):
+        self._call("clear")
+        self.values = []
+
+    def update(self, values=None, range_name=None, **kwargs):
+        self._call("update")
+        self.values = [[str(v) for v in r] for r in values]
+
+
+class FakeSpreadsheet:
+    """Stand-in for ``gspread.Spreadsheet``; counts every API request."""
+
+    def __init__(self, sheets=None, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._worksheets = {
+            title: FakeWorksheet(self, title, values) for title, values in (sheets or {}).items()
+        }
+
+    def _call(self, op):
+        with self._lock:
+            self.calls[op] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def worksheet(self, title):
+        self._call("worksheet")
+        ws = self._worksheets.get(title)
+        if ws is None:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return ws
+
+    def add_worksheet(self, title, rows=1000, cols=26, **kwargs):
+        self._call("add_worksheet")
+        ws = self._worksheets[title] = FakeWorksheet(self, title)
+        return ws
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
@@ -0,0 +1,126 @@
+"""Synthetic ledgers and recorded provider / Sheets fixtures for the benchmarks.
+
+``python -m bench.fixtures record`` downloads the current pairs' daily bars
+from Yahoo and (if Google Sheets is configured) the Trades / Holdings values,
+and saves them under ``bench/fixtures/``. The benchmarks replay whatever was
+recorded and fall back to synthetic data for anything that wasn't, so they
+never need network access.
+"""
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+import sheets
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# Enough distinct ISO codes for the largest pair count benchmarked.
+CURRENCIES = (
+    "USD EUR JPY GBP AUD CNY MYR THB HKD TWD KRW INR IDR PHP VND NZD CAD CHF "
+    "SEK NOK DKK PLN CZK HUF RON BGN ISK TRY ILS AED SAR QAR KWD BHD OMR JOD "
+    "EGP MAD TND ZAR NGN KES GHS UGX TZS ETB BRL MXN ARS CLP COP PEN UYU PYG "
+    "BOB CRC DOP GTQ HNL NIO PAB JMD TTD BBD BSD BZD XCD PKR BDT LKR NPR MMK "
+    "KHR LAK MNT KZT UZS AZN GEL AMD UAH RSD MKD ALL BAM MDL BYN FJD PGK WST "
+    "TOP VUV SBD XPF MOP BND MVR SCR MUR SLE LRD"
+).split()
+
+
+def synthetic_pairs(n):
+    """``{ccy: "SGD<ccy>=X"}`` for the first ``n`` currencies."""
+    if n > len(CURRENCIES):
+        raise ValueError(f"At most {len(CURRENCIES)} pairs are available")
+    return {c: f"SGD{c}=X" for c in CURRENCIES[:n]}
+
+
+def synthetic_trades(n, ccys, seed=0, start="2022-01-03"):
+    """``n`` Trades rows (header first) spread over ``ccys``: mostly SGD buys,
+    with every fifth trade selling part of a holding back to SGD."""
+    rng = np.random.default_rng(seed)
+    ccys = list(ccys)
+    dates = pd.Timestamp(start) + pd.to_timedelta(np.sort(rng.uniform(0, 4 * 365, n)), unit="D")
+    picks = rng.integers(0, len(ccys), n)
+    amounts = np.round(rng.uniform(50, 5000, n), 2)
+    rates = np.round(10 ** rng.uniform(-1, 3, len(ccys)), 4)
+    rows = [list(sheets.TRADES_HEADER)]
+    for i in range(n):
+        ccy = ccys[picks[i]]
+        rate = rates[picks[i]] * (1 + rng.normal(0, 0.01))
+        if i % 5 == 4:
+            from_ccy, to_ccy, rate = ccy, "SGD", 1 / rate
+        else:
+            from_ccy, to_ccy = "SGD", ccy
+        rate = round(rate, 6)
+        rows.append([
+            dates[i].strftime("%Y-%m-%d %H:%M:%S"), from_ccy, to_ccy, amounts[i], rate,
+            round(amounts[i] * rate, 4), "", rate, 0.0,
+        ])
+    return rows
+
+
+def synthetic_holdings(ccys, seed=0):
+    """Holdings rows (header first), one per currency, half with a cost."""
+    rng = np.random.default_rng(seed)
+    rows = [list(sheets.HOLDINGS_HEADER)]
+    for i, ccy in enumerate(ccys):
+        cost = round(float(rng.uniform(0.001, 2)), 6) if i % 2 == 0 else ""
+        rows.append([ccy, round(float(rng.uniform(10, 10000)), 2), cost])
+    return rows
+
+
+# --------------- Recorded fixtures ---------------
+
+def _bars_path(root):
+    return os.path.join(root, "bars.pkl")
+
+
+def _sheets_path(root):
+    return os.path.join(root, "sheets.json")
+
+
+def load_recorded(root=FIXTURES_DIR):
+    """``(bars, sheets)``: ``{ticker: OHLC DataFrame}`` and ``{title: values}``,
+    empty where nothing was recorded."""
+    bars = {}
+    if os.path.exists(_bars_path(root)):
+        bars = pd.read_pickle(_bars_path(root))
+    sheet_values = {}
+    if os.path.exists(_sheets_path(root)):
+        with open(_sheets_path(root)) as f:
+            sheet_values = json.load(f)
+    return bars, sheet_values
+
+
+def record(root=FIXTURES_DIR, pairs_file="pairs.json", period="2y"):
+    """Saves real Yahoo bars for every tracked pair and, if configured, the
+    Trades / Holdings sheet values. Needs network access."""
+    import yfinance as yf
+
+    os.makedirs(root, exist_ok=True)
+    with open(pairs_file) as f:
+        tickers = sorted(set(json.load(f).values()))
+    df = yf.download(tickers, period=period, interval="1d", progress=False)
+    bars = {}
+    for t in tickers:
+        frame = pd.DataFrame({f: df[f][t] for f in ("Open", "High", "Low", "Close")}).dropna()
+        if not frame.empty:
+            bars[t] = frame
+    pd.to_pickle(bars, _bars_path(root))
+    print(f"Recorded {len(bars)} tickers to {_bars_path(root)}")
+
+    if sheets.is_configured():
+        values = {
+            sheets.TRADES_SHEET: sheets.trades_sheet().get_all_values(),
+            sheets.HOLDINGS_SHEET: sheets.holdings_sheet().get_all_values(),
+        }
+        with open(_sheets_path(root), "w") as f:
+            json.dump(values, f)
+        print(f"Recorded {len(values[sheets.TRADES_SHEET]) - 1} trades to {_sheets_path(root)}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["record"]:
+        sys.exit("Usage: python -m bench.fixtures record")
+    record()
@@ -0,0 +1,327 @@
+"""Offline benchmarks for the bot commands and the dashboard.
+
+Every entry point runs against local stand-ins for Yahoo and Google Sheets
+(``bench.fakes``) with injected latency, over synthetic ledgers of different
+sizes and pair counts, plus the recorded ledger if one was saved with
+``python -m bench.fixtures record``. For each (entry point, ledger) it
+reports:
+
+* cold: wall time and external calls of the first call on an empty cache,
+  local mirror and history store (a freshly started process),
+* warm: median wall time and external calls of repeat calls,
+* peak: peak Python memory of the cold call (``tracemalloc``).
+
+Usage::
+
+    python -m bench.run                          # full grid
+    python -m bench.run --trades 100,10000 --pairs 8 --entry portfolio,recommend
+    python -m bench.run --json bench.json        # save results as a baseline
+    python -m bench.run --baseline bench.json    # exit 1 on regressions (CI)
+    python -m bench.run --output bench_output.txt
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench import fakes, fixtures  # noqa: E402
+
+ENTRY_POINTS = ["checkrates", "portfolio", "recommend", "history", "dashboard"]
+DEFAULT_TRADES = [100, 1000, 10000, 100000]
+DEFAULT_PAIRS = [8, 30, 100]
+
+# Set before the app modules are imported, since they read them at import time.
+BENCH_ENV = {
+    "TELEGRAM_BOT_TOKEN": "bench",
+    "TELEGRAM_CHAT_ID": "1",
+    "GOOGLE_SERVICE_ACCOUNT": "e30=",
+    "GOOGLE_SHEET_ID": "bench",
+    "PAIRS_FILE": "pairs.json",
+    "INTRADAY_POLL": "0",
+}
+
+
+class Scenario:
+    def __init__(self, name, pairs, sheet_values):
+        self.name = name
+        self.pairs = pairs
+        self.sheet_values = sheet_values
+
+    @property
+    def trades(self):
+        return len(self.sheet_values.get("Trades", [])) - 1
+
+    @classmethod
+    def synthetic(cls, n_trades, n_pairs):
+        pairs = fixtures.synthetic_pairs(n_pairs)
+        values = {
+            "Trades": fixtures.synthetic_trades(n_trades, pairs),
+            "Holdings": fixtures.synthetic_holdings(pairs),
+        }
+        return cls(f"{n_trades}x{n_pairs}", pairs, values)
+
+
+class Bench:
+    """Owns the scratch directory and resets every cache between runs."""
+
+    def __init__(self, yahoo_latency, sheets_latency, recorded_bars, repeat):
+        self.yahoo_latency = yahoo_latency
+        self.sheets_latency = sheets_latency
+        self.recorded_bars = recorded_bars
+        self.repeat = repeat
+        self.workdir = tempfile.mkdtemp(prefix="fxbench-")
+        self._runs = 0
+        os.environ.update(BENCH_ENV)
+        self._chdir_fresh()
+        shutil.copy(os.path.join(ROOT, "pairs.json"), "pairs.json")  # read by bot at import
+
+        import yfinance
+        import bot
+        import quotes
+        import sheets
+
+        self.yfinance, self.bot, self.quotes, self.sheets = yfinance, bot, quotes, sheets
+        self.yahoo = self.spreadsheet = None
+
+    def _chdir_fresh(self):
+        self._runs += 1
+        path = os.path.join(self.workdir, f"run{self._runs}")
+        os.makedirs(path)
+        os.chdir(path)
+        return path
+
+    def reset(self, scenario):
+        """A clean process state for ``scenario``: new scratch dir (ledger.db,
+        history/, positions.json), empty caches, a closed breaker, fresh fakes."""
+        import breaker
+        import chats
+        import historystore
+        import snapshot
+        import windows
+
+        self._chdir_fresh()
+        with open("pairs.json", "w") as f:
+            json.dump(scenario.pairs, f)
+
+        self.yahoo = fakes.FakeYahoo(self.recorded_bars, latency=self.yahoo_latency)
+        self.spreadsheet = fakes.FakeSpreadsheet(scenario.sheet_values, latency=self.sheets_latency)
+        self.yfinance.download = self.yahoo.download
+        self.sheets.get_spreadsheet = lambda: self.spreadsheet
+        self.sheets.reset()
+
+        breaker.YAHOO = breaker.CircuitBreaker("Yahoo")
+        self.quotes._cache.invalidate()
+        self.quotes._store = historystore.HistoryStore(download=self.quotes.download_bars)
+        self.quotes._snapshot = snapshot.Snapshot()
+
+        bot = self.bot
+        bot.PAIRS = dict(scenario.pairs)
+        bot.WINDOWS = windows.WindowEngine()
+        bot.CHATS = chats.ChatRegistry(bot.TELEGRAM_CHAT_ID)
+        bot.PRIMARY = bot.CHATS.primary
+
+        try:
+            import streamlit as st
+        except ImportError:
+            pass
+        else:
+            st.cache_data.clear()
+            st.cache_resource.clear()
+
+    def entry_point(self, name):
+        bot = self.bot
+        return {
+            "checkrates": bot.get_checkrates,
+            "portfolio": bot.get_portfolio_summary,
+            "recommend": bot.get_recommendations,
+            "history": bot.get_trade_history,
+            "dashboard": self.render_dashboard,
+        }[name]
+
+    def render_dashboard(self):
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file(os.path.join(ROOT, "currency.py"), default_timeout=600)
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+
+    def _counts(self):
+        return self.yahoo.calls, self.spreadsheet.total_calls()
+
+    def measure(self, entry, scenario):
+        func = self.entry_point(entry)
+
+        self.reset(scenario)
+        start = time.perf_counter()
+        func()
+        cold = time.perf_counter() - start
+        cold_calls = self._counts()
+
+        warm_times = []
+        for _ in range(self.repeat):
+            before = self._counts()
+            start = time.perf_counter()
+            func()
+            warm_times.append(time.perf_counter() - start)
+            after = self._counts()
+        warm_calls = (after[0] - before[0], after[1] - before[1])
+
+        # Memory is measured on its own cold run: tracemalloc slows everything down.
+        self.reset(scenario)
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "entry": entry,
+            "ledger": scenario.name,
+            "trades": scenario.trades,
+            "pairs": len(scenario.pairs),
+            "cold_ms": cold * 1000,
+            "warm_ms": statistics.median(warm_times) * 1000,
+            "cold_yf": cold_calls[0],
+            "cold_sheets": cold_calls[1],
+            "warm_yf": warm_calls[0],
+            "warm_sheets": warm_calls[1],
+            "peak_kib": peak / 1024,
+        }
+
+    def close(self):
+        os.chdir(ROOT)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+# --------------- Reporting ---------------
+
+COLUMNS = [
+    ("entry", "entry", "{}"),
+    ("ledger", "ledger", "{}"),
+    ("cold_ms", "cold ms", "{:.1f}"),
+    ("warm_ms", "warm ms", "{:.1f}"),
+    ("cold_yf", "cold yf", "{}"),
+    ("cold_sheets", "cold gs", "{}"),
+    ("warm_yf", "warm yf", "{}"),
+    ("warm_sheets", "warm gs", "{}"),
+    ("peak_kib", "peak KiB", "{:.0f}"),
+]
+
+
+def format_table(results):
+    rows = [[label for _, label, _ in COLUMNS]]
+    rows += [[fmt.format(r[key]) for key, _, fmt in COLUMNS] for r in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(COLUMNS))]
+    lines = ["  ".join(cell.rjust(w) if i > 1 else cell.ljust(w) for i, (cell, w) in enumerate(zip(row, widths)))
+             for row in rows]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    return "\n".join(lines)
+
+
+def compare(results, baseline, max_regression):
+    """Regressions against a saved run: any increase in external calls, or
+    wall time more than ``max_regression`` (a fraction) slower."""
+    previous = {(r["entry"], r["ledger"]): r for r in baseline}
+    problems = []
+    for r in results:
+        old = previous.get((r["entry"], r["ledger"]))
+        if old is None:
+            continue
+        where = f"{r['entry']} [{r['ledger']}]"
+        for key in ("cold_yf", "cold_sheets", "warm_yf", "warm_sheets"):
+            if r[key] > old[key]:
+                problems.append(f"{where}: {key} {old[key]} -> {r[key]}")
+        for key in ("cold_ms", "warm_ms"):
+            # Sub-millisecond timings are noise.
+            if r[key] > max(old[key], 1.0) * (1 + max_regression):
+                problems.append(f"{where}: {key} {old[key]:.1f} -> {r[key]:.1f}")
+    return problems
+
+
+def _int_list(text):
+    return [int(x) for x in text.split(",") if x]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the bot and dashboard.")
+    parser.add_argument("--trades", type=_int_list, default=DEFAULT_TRADES, help="comma-separated ledger sizes")
+    parser.add_argument("--pairs", type=_int_list, default=DEFAULT_PAIRS, help="comma-separated pair counts")
+    parser.add_argument("--entry", default=",".join(ENTRY_POINTS), help="comma-separated entry points")
+    parser.add_argument("--yf-latency", type=float, default=0.05, help="seconds per yf.download call")
+    parser.add_argument("--sheets-latency", type=float, default=0.02, help="seconds per Sheets request")
+    parser.add_argument("--repeat", type=int, default=3, help="warm calls per measurement")
+    parser.add_argument("--fixtures", default=fixtures.FIXTURES_DIR, help="recorded fixtures directory")
+    parser.add_argument("--output", help="also write the table to this file (e.g. bench_output.txt)")
+    parser.add_argument("--json", help="save raw results to this file")
+    parser.add_argument("--baseline", help="compare against results saved with --json")
+    parser.add_argument("--max-regression", type=float, default=0.5,
+                        help="allowed wall-time slowdown vs the baseline (0.5 = 50%%)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    entries = [e for e in args.entry.split(",") if e]
+    unknown = set(entries) - set(ENTRY_POINTS)
+    if unknown:
+        parser.error(f"unknown entry point(s): {', '.join(sorted(unknown))}")
+    if "dashboard" in entries:
+        try:
+            import streamlit.testing.v1  # noqa: F401
+        except ImportError:
+            print("streamlit not installed; skipping the dashboard benchmark", file=sys.stderr)
+            entries.remove("dashboard")
+
+    bars, sheet_values = fixtures.load_recorded(args.fixtures)
+    scenarios = [Scenario.synthetic(t, p) for p in args.pairs for t in args.trades]
+    if sheet_values:
+        with open(os.path.join(ROOT, os.environ.get("PAIRS_FILE", "pairs.json"))) as f:
+            scenarios.append(Scenario("recorded", json.load(f), sheet_values))
+
+    bench = Bench(args.yf_latency, args.sheets_latency, bars, args.repeat)
+    results = []
+    try:
+        for scenario in scenarios:
+            for entry in entries:
+                result = bench.measure(entry, scenario)
+                results.append(result)
+                print(f"{entry:>10} [{scenario.name}] cold {result['cold_ms']:.1f} ms, "
+                      f"warm {result['warm_ms']:.1f} ms", file=sys.stderr)
+    finally:
+        bench.close()
+
+    table = format_table(results)
+    header = (f"yf latency {args.yf_latency * 1000:.0f} ms, sheets latency "
+              f"{args.sheets_latency * 1000:.0f} ms, {args.repeat} warm calls, "
+              f"recorded tickers: {len(bars)}")
+    print(header)
+    print(table)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(f"{header}\n{table}\n")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.max_regression)
+        if problems:
+            print("\nRegressions:\n" + "\n".join(f"  {p}" for p in problems))
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
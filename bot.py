@@ -1,25 +1,39 @@
 import os
 import json
-import base64
+import asyncio
 import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 
-import gspread
-from google.oauth2.service_account import Credentials
 from telegram import Update
 from telegram.ext import (
     Application,
     CommandHandler,
     ContextTypes,
 )
-import yfinance as yf
+
+import alerts
+import breaker
+import chats
+import intraday
+import ledger
+import metrics
+import pnl
+import positions
+import quotes
+import ratematrix
+import sheets
+import snapshot
+import windows
+import writequeue
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 TELEGRAM_BOT_TOKEN = os.environ["TELEGRAM_BOT_TOKEN"]
 TELEGRAM_CHAT_ID = os.environ["TELEGRAM_CHAT_ID"]
-GOOGLE_SHEET_ID = os.environ["GOOGLE_SHEET_ID"]
 
 PAIRS_FILE = os.environ.get("PAIRS_FILE", "pairs.json")
 
@@ -34,93 +48,104 @@ def save_pairs(pairs):
         json.dump(pairs, f, indent=2)
 
 
+# Replaced, never mutated, so readers on worker threads can iterate a
+# reference safely; _pairs_lock serializes the read-modify-write in add/remove.
 PAIRS = load_pairs()
+_pairs_lock = threading.Lock()
 
 SG_TZ = timezone(timedelta(hours=8))
 
+# Every served chat has its own Trades / Holdings sheets, read through a local
+# SQLite mirror, and its own position book. TELEGRAM_CHAT_ID is always served.
+CHATS = chats.ChatRegistry(TELEGRAM_CHAT_ID)
+PRIMARY = CHATS.primary
 
-# --------------- Google Sheets ---------------
 
-def get_gsheet():
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    service_account_b64 = os.environ["GOOGLE_SERVICE_ACCOUNT"]
-    service_account_info = json.loads(base64.b64decode(service_account_b64))
-    creds = Credentials.from_service_account_info(service_account_info, scopes=scopes)
-    gc = gspread.authorize(creds)
-    return gc.open_by_key(GOOGLE_SHEET_ID)
+def mark_sheet_dirty(sheet):
+    for chat in CHATS.for_sheet(sheet):
+        chat.ledger.mark_dirty()
+
+
+# Trade rows are spooled locally and appended to the sheet in the background.
+TRADE_QUEUE = writequeue.WriteQueue(on_flush=mark_sheet_dirty)
+
+# Blocking Yahoo / Google Sheets I/O runs on a bounded thread pool so the
+# event loop keeps serving other chats while one command waits on the network.
+BOT_WORKERS = int(os.environ.get("BOT_WORKERS", 8))
+BLOCKING_CALL_TIMEOUT = float(os.environ.get("BLOCKING_CALL_TIMEOUT", 60))
+# Overall time a command (or each blocking step of a job) may spend on Yahoo;
+# its downloads share it and are skipped once it has run out.
+COMMAND_DEADLINE = float(os.environ.get("COMMAND_DEADLINE", 20))
+# Warm-up jobs refresh quotes, window stats and the ledger ahead of demand;
+# keep this below QUOTE_CACHE_TTL so commands never see an expired quote.
+WARM_INTERVAL = float(os.environ.get("WARM_INTERVAL", 240))
+
+_executor = ThreadPoolExecutor(max_workers=BOT_WORKERS, thread_name_prefix="bot-io")
+
+
+async def run_blocking(func, *args, timeout=BLOCKING_CALL_TIMEOUT, **kwargs):
+    """Awaits ``func(*args, **kwargs)`` on the worker pool, raising
+    ``asyncio.TimeoutError`` if it doesn't finish within ``timeout`` seconds.
+    The call runs under what is left of the command's deadline, or a fresh
+    ``COMMAND_DEADLINE`` outside a command."""
+    loop = asyncio.get_running_loop()
+    left = breaker.time_left()
+    budget = COMMAND_DEADLINE if left is None else left
+
+    def call():
+        with breaker.deadline(budget):
+            return func(*args, **kwargs)
+
+    return await asyncio.wait_for(loop.run_in_executor(_executor, call), timeout)
+
+
+def with_deadline(handler):
+    """Gives one command handler a ``COMMAND_DEADLINE`` shared by all its blocking calls."""
+    @functools.wraps(handler)
+    async def run(update, context):
+        with breaker.deadline(COMMAND_DEADLINE):
+            return await handler(update, context)
+    return run
+
 
+# --------------- Pairs ---------------
 
 def add_pair(ccy, base="SGD"):
+    global PAIRS
     ticker = f"{base}{ccy}=X"
-    rate = get_market_rate(base, ccy)
-    if rate is None:
+    q = quotes.fetch_quotes([ticker])[ticker]
+    if q is None:
         return None, None
-    PAIRS[ccy] = ticker
-    save_pairs(PAIRS)
+    rate = q["last"]
+    with _pairs_lock:
+        PAIRS = {**PAIRS, ccy: ticker}
+        save_pairs(PAIRS)
     return ticker, rate
 
 
 def remove_pair(ccy):
+    global PAIRS
     ccy = ccy.upper()
-    if ccy not in PAIRS:
-        return False
-    PAIRS.pop(ccy)
-    save_pairs(PAIRS)
+    with _pairs_lock:
+        if ccy not in PAIRS:
+            return False
+        PAIRS = {c: t for c, t in PAIRS.items() if c != ccy}
+        save_pairs(PAIRS)
     return True
 
 
-def ensure_trades_sheet(spreadsheet):
-    try:
-        ws = spreadsheet.worksheet("Trades")
-    except gspread.exceptions.WorksheetNotFound:
-        ws = spreadsheet.add_worksheet(title="Trades", rows=1000, cols=10)
-        ws.append_row([
-            "Date", "From", "To", "Amount", "Rate",
-            "Converted", "Notes", "Market Rate", "Spread %",
-        ])
-    return ws
-
+# --------------- Google Sheets ---------------
 
-def ensure_holdings_sheet(spreadsheet):
-    try:
-        ws = spreadsheet.worksheet("Holdings")
-    except gspread.exceptions.WorksheetNotFound:
-        ws = spreadsheet.add_worksheet(title="Holdings", rows=100, cols=3)
-        ws.append_row(["Currency", "Amount", "Avg SGD Cost (optional)"])
-    return ws
-
-
-def get_holdings():
-    """Reads the user-maintained Holdings sheet: Currency | Amount | Avg SGD Cost (optional)."""
-    sp = get_gsheet()
-    ws = ensure_holdings_sheet(sp)
-    rows = ws.get_all_records()
-    holdings = {}
-    for r in rows:
-        ccy = str(r.get("Currency", "")).upper().strip()
-        amount = r.get("Amount", 0)
-        cost = r.get("Avg SGD Cost (optional)", "")
-        try:
-            amount = float(amount or 0)
-        except (TypeError, ValueError):
-            amount = 0
-        try:
-            cost = float(cost) if cost not in ("", None) else None
-        except (TypeError, ValueError):
-            cost = None
-        if ccy and amount > 0:
-            holdings[ccy] = {"amount": amount, "avg_cost": cost}
-    return holdings
+def get_holdings(chat=None):
+    """The user-maintained Holdings sheet (Currency | Amount | Avg SGD Cost), via the ledger mirror."""
+    return (chat or PRIMARY).ledger.holdings()
 
 
-def set_holding(ccy, amount, avg_cost=None):
+def set_holding(ccy, amount, avg_cost=None, chat=None):
     """Create or update a row in the Holdings sheet for the given currency."""
+    chat = chat or PRIMARY
     ccy = ccy.upper()
-    sp = get_gsheet()
-    ws = ensure_holdings_sheet(sp)
+    ws = chat.holdings_ws()
     cell = ws.find(ccy, in_column=1)
     cost_val = avg_cost if avg_cost is not None else ""
     if cell:
@@ -128,22 +153,23 @@ def set_holding(ccy, amount, avg_cost=None):
         ws.update_cell(cell.row, 3, cost_val)
     else:
         ws.append_row([ccy, amount, cost_val])
+    chat.ledger.mark_dirty()
 
 
-def remove_holding(ccy):
+def remove_holding(ccy, chat=None):
+    chat = chat or PRIMARY
     ccy = ccy.upper()
-    sp = get_gsheet()
-    ws = ensure_holdings_sheet(sp)
+    ws = chat.holdings_ws()
     cell = ws.find(ccy, in_column=1)
     if cell:
         ws.delete_rows(cell.row)
+        chat.ledger.mark_dirty()
         return True
     return False
 
 
-def log_trade(from_ccy, to_ccy, amount, rate, notes=""):
-    sp = get_gsheet()
-    ws = ensure_trades_sheet(sp)
+def log_trade(from_ccy, to_ccy, amount, rate, notes="", chat=None):
+    chat = chat or PRIMARY
     now = datetime.now(SG_TZ).strftime("%Y-%m-%d %H:%M:%S")
     converted = round(amount * rate, 4)
 
@@ -154,103 +180,129 @@ def log_trade(from_ccy, to_ccy, amount, rate, notes=""):
         spread_pct = ""
         market_rate = ""
 
-    ws.append_row([
+    row = [
         now, from_ccy, to_ccy, amount, rate,
         converted, notes, market_rate, spread_pct,
-    ])
+    ]
+    TRADE_QUEUE.enqueue(chat.trades_sheet, row)
     return converted, market_rate, spread_pct
 
 
-def _close_series(df):
-    s = df.get("Close")
-    if s is None:
-        return None
-    if hasattr(s, "columns"):
-        s = s.iloc[:, 0]
-    s = s.dropna()
-    return s if not s.empty else None
+def sync_positions(chat=None):
+    """Brings the chat's lot-based position book up to date with its Trades ledger."""
+    chat = chat or PRIMARY
+    chat.positions.catch_up(chat.ledger)
+    return chat.positions
+
+
+def derive_holdings(chat=None):
+    """Rewrites the Holdings sheet from the position book; returns the rows written."""
+    chat = chat or PRIMARY
+    held = sync_positions(chat).holdings()
+    rows = [
+        [ccy, round(h["amount"], 4), "" if h["avg_cost"] is None else round(h["avg_cost"], 6)]
+        for ccy, h in held.items()
+    ]
+    ws = chat.holdings_ws()
+    # One write that also blanks any leftover rows/columns, instead of
+    # clear() + update(): a failed update must not leave the sheet empty.
+    existing = ws.get_all_values()
+    values = [list(sheets.HOLDINGS_HEADER)] + rows
+    width = max([len(sheets.HOLDINGS_HEADER)] + [len(r) for r in existing])
+    height = max(len(values), len(existing))
+    values = [r + [""] * (width - len(r)) for r in values] + [[""] * width] * (height - len(values))
+    ws.update(values=values, range_name="A1")
+    chat.ledger.mark_dirty()
+    return rows
+
+
+async def positions_job(context: ContextTypes.DEFAULT_TYPE):
+    for chat in CHATS.all():
+        try:
+            await run_blocking(sync_positions, chat)
+            await run_blocking(chat.positions.checkpoint)
+        except Exception as e:
+            logger.warning(f"Position checkpoint failed for chat {chat.chat_id}: {e}")
+
+
+def get_rate_matrix(ccys=()):
+    """Cross-rate matrix for all tracked pairs plus any extra currencies."""
+    return ratematrix.load_rate_matrix(PAIRS, ccys)
 
 
 def get_market_rate(from_ccy, to_ccy):
-    ticker = f"{from_ccy}{to_ccy}=X"
+    return get_rate_matrix([from_ccy, to_ccy]).rate(from_ccy, to_ccy)
+
+
+def get_market_quote(from_ccy, to_ccy):
+    """``(rate, age in seconds)``; the rate may be a last known good quote."""
+    rates = get_rate_matrix([from_ccy, to_ccy])
+    return rates.rate(from_ccy, to_ccy), rates.age(from_ccy, to_ccy)
+
+
+def format_age(seconds):
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+def stale_note(age):
+    """" (⏱ 12 min old)" for quotes served past the cache TTL, else ""."""
+    if not age or age < quotes.QUOTE_CACHE_TTL:
+        return ""
+    return f" (⏱ {format_age(age)} old)"
+
+
+def publish_snapshot():
+    """Publishes every tracked, held and alerted ticker to the snapshot the dashboard reads."""
+    ccys = {c for chat in CHATS.all() for c in get_holdings(chat)}
+    ccys |= {c for pair in ALERTS.pairs() for c in pair}
+    tickers = set(ratematrix.rate_pairs(PAIRS, ccys).values())
+    return quotes.publish_snapshot(tickers | ratematrix.direct_quote_tickers())
+
+
+async def snapshot_job(context: ContextTypes.DEFAULT_TYPE):
     try:
-        df = yf.download(ticker, period="5d", interval="1d", progress=False)
-        s = _close_series(df)
-        if s is None:
-            return None
-        return float(s.iloc[-1])
-    except Exception:
-        return None
+        n = await run_blocking(publish_snapshot)
+        logger.info(f"Published quote snapshot ({n} tickers)")
+    except Exception as e:
+        logger.warning(f"Snapshot publish failed: {e}")
+    await alerts_job(context)
+
+
+# Rolling 2-month high/low per ticker, updated incrementally as new bars arrive.
+WINDOWS = windows.WindowEngine()
+
+
+def get_window_stats(tickers):
+    """``{ticker: {"last", "high", "low", "prior_high", "pct_of_high"} or None}``."""
+    tickers = set(tickers)
+    WINDOWS.sync(quotes.fetch_closes(tickers))
+    return WINDOWS.stats(tickers)
 
 
 # --------------- Portfolio / P&L ---------------
 
-def _avg_buy_rate(rows, to_ccy):
-    """Average SGD->to_ccy rate from the Trades sheet, used as a cost-basis
-    fallback when the Holdings sheet doesn't specify one."""
-    total_converted = 0.0
-    total_spent = 0.0
-    for r in rows:
-        if r.get("From", "") != "SGD" or r.get("To", "") != to_ccy:
-            continue
-        amount = float(r.get("Amount", 0) or 0)
-        converted = float(r.get("Converted", 0) or 0)
-        if converted > 0:
-            total_converted += converted
-            total_spent += amount
-    if total_converted <= 0:
-        return None
-    return total_spent / total_converted  # SGD cost per unit of to_ccy
+def get_trade_book(chat=None):
+    """Trades parsed once into typed columns for cost-basis and P&L math."""
+    return pnl.TradeBook((chat or PRIMARY).ledger.trades())
 
 
-def get_holdings_with_pnl():
+def get_holdings_with_pnl(chat=None, rates=None):
     """Combines the Holdings sheet with live rates and cost basis to compute
     unrealized P&L per currency (used by /portfolio and /holdings)."""
-    holdings = get_holdings()
+    holdings = get_holdings(chat)
     if not holdings:
         return []
+    if rates is None:
+        rates = get_rate_matrix(holdings)
+    return pnl.holdings_pnl(holdings, get_trade_book(chat), rates)
 
-    sp = get_gsheet()
-    trades_ws = ensure_trades_sheet(sp)
-    rows = trades_ws.get_all_records()
-
-    results = []
-    for ccy, h in sorted(holdings.items()):
-        amount = h["amount"]
-        avg_cost_rate = h["avg_cost"]
-        cost_is_estimated = avg_cost_rate is None
-        if avg_cost_rate is None:
-            avg_cost_rate = _avg_buy_rate(rows, ccy)
-
-        current_rate = get_market_rate("SGD", ccy)  # SGD -> ccy, for display
-        current_value_sgd = None
-        cost_sgd = None
-        pnl = None
-        pnl_pct = None
-
-        reverse_rate = get_market_rate(ccy, "SGD")
-        if reverse_rate is not None:
-            current_value_sgd = amount * reverse_rate
-            if avg_cost_rate:
-                cost_sgd = amount * avg_cost_rate
-                pnl = current_value_sgd - cost_sgd
-                pnl_pct = pnl / cost_sgd * 100 if cost_sgd else None
-
-        results.append({
-            "ccy": ccy,
-            "amount": amount,
-            "avg_cost_rate": avg_cost_rate,
-            "cost_is_estimated": cost_is_estimated,
-            "current_value_sgd": current_value_sgd,
-            "cost_sgd": cost_sgd,
-            "pnl": pnl,
-            "pnl_pct": pnl_pct,
-        })
-    return results
 
-
-def get_portfolio_summary():
-    holdings = get_holdings_with_pnl()
+def get_portfolio_summary(chat=None):
+    chat = chat or PRIMARY
+    rates = get_rate_matrix(get_holdings(chat))
+    holdings = get_holdings_with_pnl(chat, rates)
     if not holdings:
         return None
 
@@ -276,113 +328,111 @@ def get_portfolio_summary():
         total_pnl = total_value - total_cost
         total_pnl_pct = total_pnl / total_cost * 100
         lines.append(f"Total unrealized P&L: {total_pnl:+,.2f} SGD ({total_pnl_pct:+.2f}%)")
+
+    realized = sync_positions(chat).realized()
+    if realized:
+        per_ccy = ", ".join(f"{ccy} {value:+,.2f}" for ccy, value in realized.items())
+        lines.append(f"Realized P&L ({chat.positions.method.upper()}): {sum(realized.values()):+,.2f} SGD ({per_ccy})")
+
+    age = rates.age(*(h["ccy"] for h in holdings))
+    if stale_note(age):
+        lines.append(f"\n⏱ Live quotes are delayed; values use rates up to {format_age(age)} old.")
     return "\n".join(lines)
 
 
-def get_trade_history(limit=10):
-    sp = get_gsheet()
-    ws = ensure_trades_sheet(sp)
-    rows = ws.get_all_records()
-    if not rows:
+HISTORY_PAGE_SIZE = 10
+
+
+def get_trade_history(page=1, limit=HISTORY_PAGE_SIZE, chat=None):
+    recent, total = (chat or PRIMARY).ledger.trade_page(page, limit)
+    if not recent:
         return None
-    recent = rows[-limit:]
-    lines = [f"📜 *Last {len(recent)} trades*", ""]
+    first = max(total - page * limit, 0) + 1
+    last = total - (page - 1) * limit
+    if page == 1:
+        lines = [f"📜 *Last {len(recent)} trades*", ""]
+    else:
+        lines = [f"📜 *Trades {first}–{last} of {total}*", ""]
     for r in recent:
         spread_str = f" (spread: {r['Spread %']}%)" if r.get("Spread %") else ""
         lines.append(
             f"• {r['Date']}: {r['Amount']} {r['From']} → "
             f"{r['Converted']} {r['To']} @ {r['Rate']}{spread_str}"
         )
+    if first > 1:
+        lines.append(f"\nOlder trades: /history {page + 1}")
     return "\n".join(lines)
 
 
 # --------------- Recommendations ---------------
 
-def get_recommendations():
-    sp = get_gsheet()
-    trades_ws = ensure_trades_sheet(sp)
-    rows = trades_ws.get_all_records()
+def load_chat_books(chat=None):
+    """A chat's holdings and parsed trades, the inputs to its recommendations."""
+    return get_holdings(chat), get_trade_book(chat)
 
-    holdings = get_holdings()
-    if not holdings and not rows:
-        return None
 
-    # --- SELL side: based on what you say you currently hold ---
-    reverse_recs = []
-    for ccy, h in holdings.items():
-        total_holding = h["amount"]
-        avg_cost_rate = h["avg_cost"]
-        if avg_cost_rate is None:
-            avg_cost_rate = _avg_buy_rate(rows, ccy)
-        if avg_cost_rate is None or avg_cost_rate <= 0:
-            continue
-        total_cost = total_holding * avg_cost_rate
+def recommendation_market(books):
+    """Rates and 2-month windows for every currency in ``books`` (a list of
+    ``(holdings, trade_book)``), fetched once however many chats share them."""
+    ccys, buy_ccys = set(), set()
+    for holdings, book in books:
+        ccys |= set(holdings)
+        buy_ccys |= {to_ccy for _, to_ccy in book.pairs(from_ccy="SGD")}
+    rates = get_rate_matrix(ccys | buy_ccys)
+    high_tickers = ratematrix.rate_pairs(PAIRS, buy_ccys)
+    window = get_window_stats(high_tickers.values())
+    return rates, high_tickers, window
 
-        current_reverse_rate = get_market_rate(ccy, "SGD")
-        if current_reverse_rate is None:
-            continue
 
-        convert_back = total_holding * current_reverse_rate
-        profit = convert_back - total_cost
-        profit_pct = profit / total_cost * 100
-        if profit <= 0:
+def compute_recommendations(holdings, book, rates, high_tickers, window):
+    """Sell and buy recommendations for one chat from an already-fetched market."""
+    # --- SELL side: based on what you say you currently hold ---
+    reverse_recs = []
+    for h in pnl.holdings_pnl(holdings, book, rates):
+        if h["pnl"] is None or h["pnl"] <= 0:
             continue
-
         reverse_recs.append({
-            "to": ccy,
+            "to": h["ccy"],
             "from": "SGD",
-            "holding": total_holding,
-            "original_spent": total_cost,
-            "avg_cost_rate": avg_cost_rate,
-            "reverse_rate": current_reverse_rate,
-            "convert_back": convert_back,
-            "profit": profit,
-            "profit_pct": profit_pct,
+            "holding": h["amount"],
+            "original_spent": h["cost_sgd"],
+            "avg_cost_rate": h["avg_cost_rate"],
+            "reverse_rate": h["reverse_rate"],
+            "convert_back": h["current_value_sgd"],
+            "profit": h["pnl"],
+            "profit_pct": h["pnl_pct"],
         })
 
     # --- BUY side: unrelated to current holdings — average historical SGD->X buy rate ---
-    buy_positions = {}
-    for r in rows:
-        from_ccy = r.get("From", "")
-        to_ccy = r.get("To", "")
-        if from_ccy != "SGD":
-            continue
-        amount = float(r.get("Amount", 0) or 0)
-        converted = float(r.get("Converted", 0) or 0)
-        rate = float(r.get("Rate", 0) or 0)
-        if rate == 0:
-            continue
-        buy_positions.setdefault(to_ccy, []).append({"amount": amount, "converted": converted})
-
     forward_recs = []
-    for to_ccy, trades in buy_positions.items():
-        total_converted = sum(t["converted"] for t in trades)
-        total_original = sum(t["amount"] for t in trades)
-        avg_rate = total_converted / total_original if total_original else 0
-
-        current_forward_rate = get_market_rate("SGD", to_ccy)
+    for (_, to_ccy), pos in book.pairs(from_ccy="SGD").items():
+        current_forward_rate = rates.rate("SGD", to_ccy)
         if current_forward_rate is None:
             continue
 
-        _, two_mo_high = two_month_stats(PAIRS.get(to_ccy, f"SGD{to_ccy}=X"))
-        if two_mo_high is None:
+        w = window.get(high_tickers.get(to_ccy))
+        if w is None:
             continue
+        two_mo_high = w["high"]
 
-        pct_of_high = current_forward_rate / two_mo_high * 100
+        pct_of_high = w["pct_of_high"]
         if pct_of_high >= 98:
             forward_recs.append({
                 "to": to_ccy,
-                "avg_rate": avg_rate,
+                "avg_rate": pos["avg_rate"],
                 "current_rate": current_forward_rate,
                 "two_mo_high": two_mo_high,
                 "pct_of_high": pct_of_high,
             })
 
-    if not reverse_recs and not forward_recs:
-        return None
-
     reverse_recs.sort(key=lambda r: r["profit_pct"], reverse=True)
     forward_recs.sort(key=lambda r: r["pct_of_high"], reverse=True)
+    return reverse_recs, forward_recs
+
+
+def format_recommendations(reverse_recs, forward_recs):
+    if not reverse_recs and not forward_recs:
+        return None
 
     lines = ["💡 *Trade Recommendations*"]
 
@@ -413,69 +463,250 @@ def get_recommendations():
     return "\n".join(lines)
 
 
+def recommendations_for(books):
+    """One message (or None) per ``(holdings, trade_book)``, all computed
+    from a single shared fetch of rates and window stats."""
+    market = recommendation_market(books)
+    return [
+        format_recommendations(*compute_recommendations(holdings, book, *market))
+        if holdings or len(book) else None
+        for holdings, book in books
+    ]
+
+
+def get_recommendations(chat=None):
+    return recommendations_for([load_chat_books(chat)])[0]
+
+
 async def recommend_job(context: ContextTypes.DEFAULT_TYPE):
+    served = CHATS.all()
+    # Each chat's ledger loads concurrently; quotes are fetched once for all of them.
+    loaded = await asyncio.gather(
+        *(run_blocking(load_chat_books, chat) for chat in served), return_exceptions=True
+    )
+    ready = []
+    for chat, books in zip(served, loaded):
+        if isinstance(books, BaseException):
+            logger.error(f"Recommend job could not load chat {chat.chat_id}: {books!r}")
+        else:
+            ready.append((chat, books))
+    if not ready:
+        return
     try:
-        msg = get_recommendations()
-        if msg:
-            await context.bot.send_message(
-                chat_id=TELEGRAM_CHAT_ID, text=msg, parse_mode="Markdown"
-            )
+        msgs = await run_blocking(recommendations_for, [books for _, books in ready])
+    except asyncio.TimeoutError:
+        logger.error("Recommend job timed out")
+        return
     except Exception as e:
         logger.error(f"Recommend job failed: {e}")
+        return
+    for (chat, _), msg in zip(ready, msgs):
+        if not msg:
+            continue
+        try:
+            await context.bot.send_message(chat_id=chat.chat_id, text=msg, parse_mode="Markdown")
+        except Exception as e:
+            logger.error(f"Could not send recommendations to chat {chat.chat_id}: {e}")
+
+
+# --------------- Intraday alerts ---------------
+
+INTRADAY = intraday.IntradayMonitor()
+
+
+def intraday_levels():
+    """``{chat_id: {ticker: levels}}``: near-high levels for every SGD-based
+    pair, shared by all chats, plus take-profit levels from each chat's holdings."""
+    pairs = PAIRS
+    tickers = {t for t in pairs.values() if ratematrix.parse_ticker(t)[0] == "SGD"}
+    window = get_window_stats(tickers)
+    near_high = {t: w["high"] * intraday.NEAR_HIGH_PCT / 100 if w else None for t, w in window.items()}
+    levels = {}
+    for chat in CHATS.all():
+        chat_levels = {t: {"near_high": price} for t, price in near_high.items()}
+        for h in get_holdings_with_pnl(chat):
+            ticker = pairs.get(h["ccy"])
+            if ticker in chat_levels and h["avg_cost_rate"]:
+                # SGD -> CCY falling to 1 / cost means CCY -> SGD pays back the cost.
+                chat_levels[ticker]["take_profit"] = 1 / h["avg_cost_rate"]
+        levels[chat.chat_id] = chat_levels
+    return levels
+
+
+def format_intraday_alert(alert):
+    _, ccy = ratematrix.parse_ticker(alert["ticker"])
+    price, threshold = alert["price"], alert["threshold"]
+    when = alert["time"].strftime("%H:%M")
+    if alert["level"] == "near_high":
+        high = threshold * 100 / intraday.NEAR_HIGH_PCT
+        return (
+            f"📈 *SGD → {ccy} near its 2-month high* ({when})\n"
+            f"  Now: {price:.4f} | 2-mo high: {high:.4f} ({price / high * 100:.1f}%)\n"
+            f"  Good time to buy {ccy}"
+        )
+    return (
+        f"💰 *{ccy} → SGD reached your take-profit level* ({when})\n"
+        f"  1 {ccy} = {1 / price:.4f} SGD | your avg cost: {1 / threshold:.4f}\n"
+        f"  Converting back now would lock in a profit"
+    )
 
 
-# --------------- Rate checking ---------------
+async def intraday_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        levels = await run_blocking(intraday_levels)
+        fired = await run_blocking(INTRADAY.poll, levels)
+    except Exception as e:
+        logger.warning(f"Intraday poll failed: {e}")
+        return
+    for alert in fired:
+        try:
+            await context.bot.send_message(
+                chat_id=alert["chat_id"], text=format_intraday_alert(alert), parse_mode="Markdown"
+            )
+        except Exception as e:
+            logger.error(f"Could not send an intraday alert to chat {alert['chat_id']}: {e}")
 
-def last_close(ticker):
-    df = yf.download(ticker, period="5d", interval="1d", progress=False)
-    s = _close_series(df)
-    if s is None:
-        return None, None
-    last = float(s.iloc[-1])
-    prev = float(s.iloc[-2]) if len(s) > 1 else None
-    return last, prev
 
+# --------------- Price alerts ---------------
+
+ALERTS = alerts.AlertBook()
 
-def two_month_stats(ticker):
-    df = yf.download(ticker, period="2mo", interval="1d", progress=False)
-    s = _close_series(df)
-    if s is None:
-        return None, None
-    all_max = float(s.max())
-    prior_max = float(s.iloc[:-1].max()) if len(s) > 1 else all_max
-    return prior_max, all_max
 
+def check_alerts():
+    """Evaluates every /alert rule against current rates; returns the fired rules.
+    Pairs whose quotes are past ``QUOTE_CACHE_TTL`` (served stale while they
+    refresh) are skipped until the refresh lands, so a rule never fires on an old rate."""
+    pairs = ALERTS.pairs()
+    if not pairs:
+        return []
+    rates = get_rate_matrix({c for pair in pairs for c in pair})
+
+    def fresh_rate(from_ccy, to_ccy):
+        if rates.age(from_ccy, to_ccy) > quotes.QUOTE_CACHE_TTL:
+            return None
+        return rates.rate(from_ccy, to_ccy)
 
-def get_checkrates_sgd_to_fx():
+    return ALERTS.check(fresh_rate)
+
+
+def format_rule(rule):
+    return f"#{rule['id']}: {rule['from']} → {rule['to']} {rule['op']} {rule['threshold']:.4f}"
+
+
+async def alerts_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        fired = await run_blocking(check_alerts)
+    except Exception as e:
+        logger.warning(f"Alert check failed: {e}")
+        return
+    for rule in fired:
+        await context.bot.send_message(
+            chat_id=rule["chat_id"],
+            text=(
+                f"🔔 *Alert {format_rule(rule)}*\n"
+                f"  1 {rule['from']} = {rule['rate']:.4f} {rule['to']}"
+            ),
+            parse_mode="Markdown",
+        )
+
+
+# --------------- Rate checking ---------------
+
+def get_checkrates_sgd_to_fx(market=None, window=None):
+    pairs = PAIRS
+    if market is None:
+        market = quotes.fetch_quotes(pairs.values())
+    if window is None:
+        window = get_window_stats(pairs.values())
     now_sgt = datetime.now(timezone.utc).astimezone(SG_TZ)
     date_str = now_sgt.strftime("%Y-%m-%d %H:%M SGT")
     lines = [f"📈 *SGD → Foreign Currency* [{date_str}]", ""]
-    for ccy, tkr in PAIRS.items():
-        last, prev = last_close(tkr)
-        _, all_max = two_month_stats(tkr)
-        if last is None:
+    for ccy, tkr in pairs.items():
+        q = market.get(tkr)
+        if q is None:
             lines.append(f"• SGD→{ccy}: — (no data)")
             continue
+        w = window.get(tkr)
+        last, prev = q["last"], q["prev"]
+        all_max = w["high"] if w else None
         delta = f" ({last - prev:+.4f})" if prev else ""
         high_str = f" | 2-mo high: {all_max:.4f}" if all_max else ""
-        pct = f" ({last / all_max * 100:.1f}%)" if all_max else ""
-        lines.append(f"• SGD→{ccy}: {last:.4f}{delta}{high_str}{pct}")
+        pct = f" ({w['pct_of_high']:.1f}%)" if all_max else ""
+        lines.append(f"• SGD→{ccy}: {last:.4f}{delta}{high_str}{pct}{stale_note(q.get('age'))}")
     return "\n".join(lines)
 
 
-def get_checkrates_fx_to_sgd():
+def get_checkrates_fx_to_sgd(rates=None):
+    if rates is None:
+        rates = get_rate_matrix()
     now_sgt = datetime.now(timezone.utc).astimezone(SG_TZ)
     date_str = now_sgt.strftime("%Y-%m-%d %H:%M SGT")
     lines = [f"📉 *Foreign Currency → SGD* [{date_str}]", ""]
     for ccy in PAIRS:
-        rate = get_market_rate(ccy, "SGD")
+        rate = rates.rate(ccy, "SGD")
         if rate is None:
             lines.append(f"• {ccy}→SGD: — (no data)")
             continue
-        lines.append(f"• 1 {ccy} = {rate:.4f} SGD")
+        lines.append(f"• 1 {ccy} = {rate:.4f} SGD{stale_note(rates.age(ccy))}")
     return "\n".join(lines)
 
 
+def get_checkrates():
+    """Both /checkrates tables from one batched quote fetch."""
+    pairs = PAIRS
+    market = quotes.fetch_quotes(pairs.values())
+    window = get_window_stats(pairs.values())
+    rates = ratematrix.build_rate_matrix(pairs, market)
+    return get_checkrates_sgd_to_fx(market, window), get_checkrates_fx_to_sgd(rates)
+
+
+# --------------- Cache warming ---------------
+
+def warm_tickers():
+    """Every ticker /checkrates, /portfolio and /recommend will ask for, across all chats."""
+    ccys = set()
+    for chat in CHATS.all():
+        holdings, book = load_chat_books(chat)
+        ccys |= set(holdings) | {to for _, to in book.pairs(from_ccy="SGD")}
+    return set(ratematrix.rate_pairs(PAIRS, ccys).values()) | ratematrix.direct_quote_tickers()
+
+
+def warm_quotes():
+    quotes.refresh(warm_tickers())
+
+
+def warm_windows():
+    get_window_stats(set(ratematrix.rate_pairs(PAIRS).values()) | warm_tickers())
+
+
+def warm_ledger():
+    for chat in CHATS.all():
+        try:
+            chat.ledger.sync()
+        except Exception as e:
+            logger.warning(f"Ledger warm-up failed for chat {chat.chat_id}: {e}")
+            continue
+        sync_positions(chat)
+
+
+# (job, interval). Each warm-up refreshes unconditionally, a little before
+# readers would find the data expired: the ledger just inside
+# LEDGER_SYNC_INTERVAL, quotes just inside QUOTE_CACHE_TTL.
+WARM_JOBS = [
+    (warm_ledger, min(WARM_INTERVAL, ledger.LEDGER_SYNC_INTERVAL * 0.9)),
+    (warm_quotes, WARM_INTERVAL),
+    (warm_windows, WARM_INTERVAL),
+]
+
+
+async def warm_job(context: ContextTypes.DEFAULT_TYPE):
+    func = context.job.data
+    try:
+        await run_blocking(func)
+    except Exception as e:
+        logger.warning(f"Warm-up {func.__name__} failed: {e}")
+
+
 # --------------- Bot commands ---------------
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -486,18 +717,30 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "  e.g. /exchange 120 SGD USD 0.7815\n"
         "/rate <from> <to> — get current market rate\n"
         "/checkrates — SGD → FX and FX → SGD rates\n"
+        "/alert <from> <to> <'>' or '<'> <rate> — notify me when a rate crosses a level\n"
+        "/alerts — list your alerts, /unalert <id> — remove one\n"
         "/portfolio — your holdings summary with P&L\n"
         "/holdings — view holdings with P&L\n"
         "/sethold <CCY> <AMOUNT> [avg_cost] — set/update a holding\n"
         "/removehold <CCY> — remove a holding\n"
-        "/history — last 10 trades\n"
+        "/syncholds — rebuild holdings from your logged trades\n"
+        "/history [page] — last 10 trades (page 2, 3… for older)\n"
         "/recommend — buy/sell recommendations\n"
         "/addpair <CCY> — add a new currency (e.g. /addpair KRW)\n"
         "/removepair <CCY> — remove a tracked currency\n"
-        "/pairs — list all tracked pairs"
+        "/pairs — list all tracked pairs\n"
+        "/subscribe [name] — give this chat its own Trades/Holdings sheets\n"
+        "/unsubscribe — stop serving this chat\n"
+        "/stats — command and API latency (admin chat only)"
     )
 
 
+def chat_for(update: Update):
+    """The books a command works on: the sender's chat if it's subscribed,
+    otherwise the primary chat's."""
+    return CHATS.get(update.effective_chat.id)
+
+
 def parse_exchange_args(args):
     """Parse flexible exchange input formats.
 
@@ -576,7 +819,12 @@ async def cmd_exchange(update: Update, context: ContextTypes.DEFAULT_TYPE):
     amount, from_ccy, to_ccy, rate, notes = parsed
 
     try:
-        converted, market_rate, spread_pct = log_trade(from_ccy, to_ccy, amount, rate, notes)
+        converted, market_rate, spread_pct = await run_blocking(
+            log_trade, from_ccy, to_ccy, amount, rate, notes, chat=chat_for(update)
+        )
+    except asyncio.TimeoutError:
+        await update.message.reply_text("❌ Timed out logging the trade — check /history before retrying.")
+        return
     except Exception as e:
         logger.error(f"Failed to log trade: {e}")
         await update.message.reply_text(f"❌ Failed to log trade: {e}")
@@ -598,23 +846,79 @@ async def cmd_rate(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     from_ccy = args[0].upper()
     to_ccy = args[1].upper()
-    rate = get_market_rate(from_ccy, to_ccy)
+    rate, age = await run_blocking(get_market_quote, from_ccy, to_ccy)
     if rate:
-        await update.message.reply_text(f"1 {from_ccy} = {rate:.4f} {to_ccy}")
+        await update.message.reply_text(f"1 {from_ccy} = {rate:.4f} {to_ccy}{stale_note(age)}")
     else:
         await update.message.reply_text(f"Could not fetch rate for {from_ccy}/{to_ccy}")
 
 
+async def cmd_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = context.args
+    # Accept both "> 0.79" and ">0.79"
+    if len(args) == 3 and args[2][:1] in alerts.OPS:
+        args = args[:2] + [args[2][0], args[2][1:]]
+    if len(args) < 4 or args[2] not in alerts.OPS:
+        await update.message.reply_text(
+            "Usage: /alert <from> <to> <'>' or '<'> <rate>\n"
+            "Example: /alert SGD USD > 0.79"
+        )
+        return
+    from_ccy, to_ccy, op = args[0].upper(), args[1].upper(), args[2]
+    try:
+        threshold = float(args[3])
+    except ValueError:
+        await update.message.reply_text("Rate must be a number.")
+        return
+
+    rate = await run_blocking(get_market_rate, from_ccy, to_ccy)
+    if rate is None:
+        await update.message.reply_text(f"Could not fetch rate for {from_ccy}/{to_ccy}")
+        return
+    rule = await run_blocking(ALERTS.add, update.effective_chat.id, from_ccy, to_ccy, op, threshold)
+    await update.message.reply_text(
+        f"🔔 Alert set {format_rule(rule)}\n"
+        f"Now: 1 {from_ccy} = {rate:.4f} {to_ccy}. You'll be notified once when it triggers."
+    )
+
+
+async def cmd_alerts(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    rules = ALERTS.for_chat(update.effective_chat.id)
+    if not rules:
+        await update.message.reply_text("No alerts set. Add one with /alert SGD USD > 0.79")
+        return
+    lines = ["🔔 Your alerts:", ""]
+    lines.extend(f"• {format_rule(r)}" for r in sorted(rules, key=lambda r: r["id"]))
+    lines.append("\nRemove one with /unalert <id>")
+    await update.message.reply_text("\n".join(lines))
+
+
+async def cmd_unalert(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    args = context.args
+    if not args:
+        await update.message.reply_text("Usage: /unalert <id>\nSee /alerts for ids.")
+        return
+    try:
+        rule_id = int(args[0].lstrip("#"))
+    except ValueError:
+        await update.message.reply_text("Alert id must be a number, e.g. /unalert 3")
+        return
+    rule = await run_blocking(ALERTS.remove, rule_id, update.effective_chat.id)
+    if rule:
+        await update.message.reply_text(f"✅ Removed alert {format_rule(rule)}")
+    else:
+        await update.message.reply_text(f"No alert #{rule_id}.")
+
+
 async def cmd_checkrates(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🔍 Fetching rates...")
-    msg_sgd = get_checkrates_sgd_to_fx()
-    msg_fx = get_checkrates_fx_to_sgd()
+    msg_sgd, msg_fx = await run_blocking(get_checkrates)
     await update.message.reply_text(msg_sgd, parse_mode="Markdown")
     await update.message.reply_text(msg_fx, parse_mode="Markdown")
 
 
 async def cmd_portfolio(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    summary = get_portfolio_summary()
+    summary = await run_blocking(get_portfolio_summary, chat_for(update))
     if summary:
         await update.message.reply_text(summary, parse_mode="Markdown")
     else:
@@ -622,16 +926,26 @@ async def cmd_portfolio(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def cmd_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    history = get_trade_history()
+    args = context.args
+    try:
+        page = int(args[0]) if args else 1
+    except ValueError:
+        page = 0
+    if page < 1:
+        await update.message.reply_text("Usage: /history [page]\nExample: /history 2")
+        return
+    history = await run_blocking(get_trade_history, page, chat=chat_for(update))
     if history:
         await update.message.reply_text(history, parse_mode="Markdown")
+    elif page > 1:
+        await update.message.reply_text(f"No trades on page {page}.")
     else:
         await update.message.reply_text("No trades recorded yet.")
 
 
 async def cmd_recommend(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🔍 Analysing your trades...")
-    msg = get_recommendations()
+    msg = await run_blocking(get_recommendations, chat_for(update))
     if msg:
         await update.message.reply_text(msg, parse_mode="Markdown")
     else:
@@ -639,7 +953,7 @@ async def cmd_recommend(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def cmd_holdings(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    holdings = get_holdings_with_pnl()
+    holdings = await run_blocking(get_holdings_with_pnl, chat_for(update))
     if not holdings:
         await update.message.reply_text(
             "No holdings set. Use /sethold <CCY> <AMOUNT> [avg_cost] to add one, "
@@ -676,7 +990,7 @@ async def cmd_sethold(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        set_holding(ccy, amount, avg_cost)
+        await run_blocking(set_holding, ccy, amount, avg_cost, chat=chat_for(update))
     except Exception as e:
         logger.error(f"Failed to set holding: {e}")
         await update.message.reply_text(f"❌ Failed to update holding: {e}")
@@ -692,12 +1006,30 @@ async def cmd_removehold(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Usage: /removehold <CCY>\nExample: /removehold JPY")
         return
     ccy = args[0].upper()
-    if remove_holding(ccy):
+    if await run_blocking(remove_holding, ccy, chat=chat_for(update)):
         await update.message.reply_text(f"✅ Removed {ccy} from holdings.")
     else:
         await update.message.reply_text(f"{ccy} is not in your holdings.")
 
 
+async def cmd_syncholds(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = chat_for(update)
+    try:
+        rows = await run_blocking(derive_holdings, chat)
+    except Exception as e:
+        logger.error(f"Failed to derive holdings: {e}")
+        await update.message.reply_text(f"❌ Failed to update holdings: {e}")
+        return
+    if not rows:
+        await update.message.reply_text("No open positions in your trades; Holdings sheet cleared.")
+        return
+    lines = [f"✅ Holdings rebuilt from trades ({chat.positions.method.upper()} cost basis):", ""]
+    for ccy, amount, cost in rows:
+        cost_str = f" @ avg {cost:.4f}" if cost != "" else " (cost unknown)"
+        lines.append(f"• {ccy}: {amount:,.2f}{cost_str}")
+    await update.message.reply_text("\n".join(lines))
+
+
 async def cmd_addpair(update: Update, context: ContextTypes.DEFAULT_TYPE):
     args = context.args
     if not args:
@@ -708,7 +1040,7 @@ async def cmd_addpair(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if ccy in PAIRS:
         await update.message.reply_text(f"{ccy} is already tracked (ticker: {PAIRS[ccy]})")
         return
-    ticker, rate = add_pair(ccy, base)
+    ticker, rate = await run_blocking(add_pair, ccy, base)
     if ticker is None:
         await update.message.reply_text(f"❌ Could not find a valid rate for {base}/{ccy}. Check the currency code.")
         return
@@ -734,32 +1066,167 @@ async def cmd_pairs(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
 
 
+async def cmd_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    if CHATS.is_subscribed(chat_id):
+        chat = CHATS.get(chat_id)
+        await update.message.reply_text(
+            f"This chat is already subscribed (sheets: {chat.trades_sheet} / {chat.holdings_sheet})."
+        )
+        return
+    name = " ".join(context.args) or None
+    try:
+        chat = await run_blocking(CHATS.subscribe, chat_id, name)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ {e}. Pick another: /subscribe <name>")
+        return
+    try:
+        # Creates the worksheets if they don't exist yet.
+        await run_blocking(chat.ledger.sync)
+    except Exception as e:
+        logger.error(f"Failed to set up sheets for chat {chat_id}: {e}")
+        await update.message.reply_text(f"❌ Subscribed, but the sheets couldn't be set up yet: {e}")
+        return
+    await update.message.reply_text(
+        f"✅ Subscribed. This chat now uses the *{chat.trades_sheet}* and "
+        f"*{chat.holdings_sheet}* sheets and gets its own recommendations.",
+        parse_mode="Markdown",
+    )
+
+
+async def cmd_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    if str(chat_id) == CHATS.primary_id:
+        await update.message.reply_text("The primary chat (TELEGRAM_CHAT_ID) can't unsubscribe.")
+        return
+    if await run_blocking(CHATS.unsubscribe, chat_id):
+        await update.message.reply_text("✅ Unsubscribed. Your sheets are left in place.")
+    else:
+        await update.message.reply_text("This chat isn't subscribed.")
+
+
+def format_stats():
+    lines = ["📈 Latency since start (count, errors, mean / p50 / p95 ms)", ""]
+    for family, title in (("command", "Commands"), ("job", "Jobs"), ("external", "External calls")):
+        rows = [r for r in metrics.summary() if r["name"] == family]
+        if not rows:
+            continue
+        lines.append(f"{title}:")
+        for r in sorted(rows, key=lambda r: r["mean"] * r["count"], reverse=True):
+            label = " ".join(str(r["labels"][k]) for k in ("service", "op", "command", "job") if k in r["labels"])
+            errors = f", {r['errors']} failed" if r["errors"] else ""
+            lines.append(
+                f"• {label}: {r['count']}×{errors} — "
+                f"{r['mean'] * 1000:.0f} / {r['p50'] * 1000:.0f} / {r['p95'] * 1000:.0f}"
+            )
+        lines.append("")
+    cache = quotes.cache_stats()
+    lines.append(
+        f"Quote cache: {cache['hits']} hits, {cache['stale']} stale, {cache['misses']} misses, "
+        f"{cache['coalesced']} coalesced, {cache['timeouts']} over budget, {cache['size']} tickers"
+    )
+    yahoo = breaker.YAHOO.stats()
+    retry = f", retry in {yahoo['retry_in']:.0f}s" if yahoo["retry_in"] is not None else ""
+    lines.append(
+        f"Yahoo breaker: {yahoo['state']}{retry} ({yahoo['trips']} trips, "
+        f"{yahoo['short_circuited']} downloads skipped)"
+    )
+    return "\n".join(lines)
+
+
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if str(update.effective_chat.id) != CHATS.primary_id:
+        await update.message.reply_text("/stats is only available in the admin chat.")
+        return
+    if not metrics.METRICS_ENABLED:
+        await update.message.reply_text("Metrics are disabled (METRICS_ENABLED=0).")
+        return
+    await update.message.reply_text(format_stats())
+
+
+async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE):
+    if isinstance(context.error, asyncio.TimeoutError):
+        logger.warning(f"Handler timed out after {BLOCKING_CALL_TIMEOUT:.0f}s")
+        if isinstance(update, Update) and update.effective_message:
+            await update.effective_message.reply_text("⏳ That took too long — please try again shortly.")
+        return
+    logger.error(f"Unhandled error: {context.error}", exc_info=context.error)
+
+
 # --------------- Main ---------------
 
+COMMANDS = {
+    "start": cmd_start,
+    "help": cmd_start,
+    "exchange": cmd_exchange,
+    "rate": cmd_rate,
+    "checkrates": cmd_checkrates,
+    "alert": cmd_alert,
+    "alerts": cmd_alerts,
+    "unalert": cmd_unalert,
+    "portfolio": cmd_portfolio,
+    "holdings": cmd_holdings,
+    "sethold": cmd_sethold,
+    "removehold": cmd_removehold,
+    "syncholds": cmd_syncholds,
+    "history": cmd_history,
+    "recommend": cmd_recommend,
+    "addpair": cmd_addpair,
+    "removepair": cmd_removepair,
+    "pairs": cmd_pairs,
+    "subscribe": cmd_subscribe,
+    "unsubscribe": cmd_unsubscribe,
+    "stats": cmd_stats,
+}
+
+
 def main():
-    app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-
-    app.add_handler(CommandHandler("start", cmd_start))
-    app.add_handler(CommandHandler("help", cmd_start))
-    app.add_handler(CommandHandler("exchange", cmd_exchange))
-    app.add_handler(CommandHandler("rate", cmd_rate))
-    app.add_handler(CommandHandler("checkrates", cmd_checkrates))
-    app.add_handler(CommandHandler("portfolio", cmd_portfolio))
-    app.add_handler(CommandHandler("holdings", cmd_holdings))
-    app.add_handler(CommandHandler("sethold", cmd_sethold))
-    app.add_handler(CommandHandler("removehold", cmd_removehold))
-    app.add_handler(CommandHandler("history", cmd_history))
-    app.add_handler(CommandHandler("recommend", cmd_recommend))
-    app.add_handler(CommandHandler("addpair", cmd_addpair))
-    app.add_handler(CommandHandler("removepair", cmd_removepair))
-    app.add_handler(CommandHandler("pairs", cmd_pairs))
+    app = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(True)
+        .build()
+    )
+
+    for name, handler in COMMANDS.items():
+        handler = with_deadline(handler)
+        app.add_handler(CommandHandler(name, metrics.instrument(handler, "command", command=name)))
+    app.add_error_handler(on_error)
 
     job_queue = app.job_queue
-    job_queue.run_repeating(recommend_job, interval=4 * 3600, first=60)
+
+    def schedule(job, name, interval, first, **kwargs):
+        job_queue.run_repeating(
+            metrics.instrument(job, "job", job=name), interval=interval, first=first, **kwargs
+        )
+
+    schedule(recommend_job, "recommend", 4 * 3600, 60)
+    schedule(positions_job, "positions", positions.POSITIONS_CHECKPOINT_INTERVAL, 30)
+    if snapshot.SNAPSHOT_INTERVAL > 0:
+        # Alerts are checked against every new snapshot.
+        schedule(snapshot_job, "snapshot", snapshot.SNAPSHOT_INTERVAL, 5)
+    else:
+        schedule(alerts_job, "alerts", quotes.QUOTE_CACHE_TTL, 5)
+    if intraday.INTRADAY_POLL > 0:
+        schedule(intraday_job, "intraday", intraday.INTRADAY_POLL, 45)
+    if WARM_INTERVAL > 0:
+        # Spread the warm-ups evenly over the interval so they don't fire together.
+        step = WARM_INTERVAL / len(WARM_JOBS)
+        for i, (func, interval) in enumerate(WARM_JOBS):
+            schedule(warm_job, func.__name__, interval, 1 + i * step, data=func, name=func.__name__)
+
+    if metrics.METRICS_ENABLED and metrics.METRICS_PORT:
+        metrics.serve(metrics.METRICS_PORT)
+    TRADE_QUEUE.start()
 
     logger.info("Bot started — polling for messages")
     app.run_polling(drop_pending_updates=True)
 
+    if not TRADE_QUEUE.drain(timeout=30):
+        logger.warning(f"Unflushed trades left in {TRADE_QUEUE.path}; they'll be sent on next start")
+    for chat in CHATS.all():
+        chat.positions.checkpoint()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,140 @@
+"""Circuit breaker and per-command deadline for Yahoo Finance downloads.
+
+Every ``yf.download`` goes through ``quotes.download_bars``, which asks
+``YAHOO`` for permission first. After ``BREAKER_FAILURES`` consecutive
+failures (errors and timeouts; a response with no data for the tickers
+asked for, such as a mistyped currency code, still counts as a success)
+the breaker opens, and downloads are skipped outright for
+``BREAKER_RESET`` seconds. Callers
+then get the same empty result as a failed download, so quotes fall back to
+the cache and the on-disk history. Once that time has passed, one probe
+request is let through (half-open): success closes the breaker, failure
+opens it again.
+
+A deadline is a point in time, kept in a context variable, by which the
+current command wants its answer. ``deadline(seconds)`` sets one (the bot
+gives each command ``COMMAND_DEADLINE``). Each download's timeout is capped
+at the time left, and callers issuing several requests can hand each an
+equal share with ``share(parts)``. Once the deadline has passed, downloads are
+skipped instead of started.
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", 3))
+BREAKER_RESET = float(os.environ.get("BREAKER_RESET", 60))
+YF_TIMEOUT = float(os.environ.get("YF_TIMEOUT", 10))
+# Below this much time left, a download isn't worth starting.
+MIN_FETCH_TIMEOUT = 1.0
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+
+class CircuitBreaker:
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failures
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0  # consecutive
+        self.opened_at = None
+        self.short_circuited = 0
+        self.trips = 0
+
+    def allow(self):
+        """Whether a request may go out now. In half-open state only the
+        first caller (the probe) is allowed until it reports back."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+                self.state = HALF_OPEN
+                logger.info(f"{self.name} breaker half-open, probing")
+                return True
+            self.short_circuited += 1
+            return False
+
+    def success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"{self.name} breaker closed")
+            self.state = CLOSED
+            self.failures = 0
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                if self.state == CLOSED:
+                    self.trips += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                logger.warning(f"{self.name} breaker open after {self.failures} failures; "
+                               f"retrying in {self.reset_after:.0f}s")
+
+    def stats(self):
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(self.reset_after - (time.monotonic() - self.opened_at), 0)
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "trips": self.trips,
+                "short_circuited": self.short_circuited,
+                "retry_in": retry_in,
+            }
+
+
+YAHOO = CircuitBreaker("Yahoo")
+
+
+# --------------- Deadlines ---------------
+
+_deadline = contextvars.ContextVar("deadline", default=None)  # time.monotonic() value
+
+
+@contextmanager
+def deadline(seconds):
+    """Runs the block with a deadline ``seconds`` from now (or the enclosing
+    deadline, if that is sooner)."""
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left():
+    """Seconds until the current deadline, or None if there is none."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def share(parts):
+    """A deadline for one of ``parts`` remaining requests: an equal share of
+    the time left. Without a deadline the block runs unrestricted."""
+    left = time_left()
+    if left is None:
+        return deadline(float("inf"))
+    return deadline(max(left, 0) / max(parts, 1))
+
+
+def fetch_timeout():
+    """Timeout for the next download: ``YF_TIMEOUT`` capped at the time left,
+    or None if there isn't enough time left to start one."""
+    left = time_left()
+    if left is None:
+        return YF_TIMEOUT
+    if left < MIN_FETCH_TIMEOUT:
+        return None
+    return min(YF_TIMEOUT, left)
@@ -0,0 +1,86 @@
+"""Rendered rate charts for the dashboard, cached as PNG bytes.
+
+Charts are keyed by (name, window, data version), where the version is a
+hash of the plotted series, so a rerun with unchanged data reuses the image
+instead of building a new matplotlib figure. Each figure is closed as soon
+as it has been rendered, and the cache holds at most ``CHART_CACHE_SIZE``
+images (least recently used are evicted), so memory stays flat however long
+the dashboard runs.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.dates as mdates
+import matplotlib.pyplot as plt
+import pandas as pd
+
+CHART_CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", 64))
+
+
+def data_version(series):
+    """Content hash of a series; changes whenever any bar changes."""
+    return int(pd.util.hash_pandas_object(series).sum())
+
+
+def render_line(series, title, ylabel):
+    """Plots ``series`` the way the dashboard always has and returns PNG bytes."""
+    fig, ax = plt.subplots(figsize=(10, 5))
+    try:
+        ax.plot(series.index, series.values, marker="o", linestyle="-")
+        ax.set_title(title, fontsize=12)
+        ax.set_xlabel("Date", fontsize=10)
+        ax.set_ylabel(ylabel, fontsize=10)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d"))
+        plt.setp(ax.get_xticklabels(), fontsize=8)
+        ax.grid(True)
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", bbox_inches="tight")
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
+
+
+class ChartCache:
+    def __init__(self, maxsize=CHART_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._images = OrderedDict()
+        self.hits = 0
+        self.renders = 0
+
+    def get(self, name, window, series, title, ylabel):
+        """PNG for ``series``, rendered only if this exact data isn't cached."""
+        key = (name, window, data_version(series))
+        with self._lock:
+            png = self._images.get(key)
+            if png is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return png
+        png = render_line(series, title, ylabel)
+        with self._lock:
+            self.renders += 1
+            self._images[key] = png
+            self._images.move_to_end(key)
+            while len(self._images) > self.maxsize:
+                self._images.popitem(last=False)
+        return png
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "renders": self.renders, "size": len(self._images)}
+
+
+_cache = ChartCache()
+
+
+def line_chart(name, window, series, title, ylabel="Exchange Rate (per 1 SGD)"):
+    return _cache.get(name, window, series, title, ylabel)
+
+
+def cache_stats():
+    return _cache.stats()
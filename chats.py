@@ -0,0 +1,130 @@
+"""Chats the bot serves, each with its own Trades/Holdings worksheets.
+
+The chat in ``TELEGRAM_CHAT_ID`` is always served and uses the ``Trades``
+and ``Holdings`` worksheets, as before. Other chats join with ``/subscribe``
+and get their own worksheets (``Trades <name>`` / ``Holdings <name>``),
+recorded in ``CHATS_FILE``. A name can only belong to one chat, so two chats
+never share a ledger. Each chat's ledger mirror and position book are
+created on first use and kept for the life of the process.
+"""
+import os
+import json
+import logging
+import threading
+
+import ledger
+import positions
+import sheets
+
+logger = logging.getLogger(__name__)
+
+CHATS_FILE = os.environ.get("CHATS_FILE", "chats.json")
+
+
+class Chat:
+    def __init__(self, chat_id, trades_sheet, holdings_sheet, positions_file):
+        self.chat_id = chat_id
+        self.trades_sheet = trades_sheet
+        self.holdings_sheet = holdings_sheet
+        self.ledger = ledger.Ledger(trades_sheet, holdings_sheet)
+        self.positions = positions.PositionBook(path=positions_file)
+
+    def holdings_ws(self):
+        return sheets.worksheet(self.holdings_sheet, sheets.HOLDINGS_HEADER, rows=100, cols=3)
+
+
+class ChatRegistry:
+    def __init__(self, primary_chat_id, path=CHATS_FILE):
+        self.primary_id = str(primary_chat_id)
+        self.path = path
+        self._lock = threading.Lock()
+        self._config = self._load()  # chat id -> {"trades", "holdings"}
+        self._chats = {}
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._config, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def _make(self, chat_id):
+        if chat_id == self.primary_id:
+            return Chat(chat_id, sheets.TRADES_SHEET, sheets.HOLDINGS_SHEET, positions.POSITIONS_FILE)
+        cfg = self._config[chat_id]
+        return Chat(chat_id, cfg["trades"], cfg["holdings"], f"positions-{chat_id}.json")
+
+    def get(self, chat_id=None):
+        """The chat's books; unknown chats (and ``None``) get the primary chat's."""
+        chat_id = str(chat_id) if chat_id is not None else self.primary_id
+        with self._lock:
+            if chat_id != self.primary_id and chat_id not in self._config:
+                chat_id = self.primary_id
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = self._make(chat_id)
+            return chat
+
+    @property
+    def primary(self):
+        return self.get(self.primary_id)
+
+    def is_subscribed(self, chat_id):
+        chat_id = str(chat_id)
+        return chat_id == self.primary_id or chat_id in self._config
+
+    def subscribe(self, chat_id, name=None):
+        """Registers a chat with its own worksheets; returns its Chat. Raises
+        ValueError if another chat already uses those worksheets."""
+        chat_id = str(chat_id)
+        if chat_id == self.primary_id:
+            return self.primary
+        with self._lock:
+            if chat_id not in self._config:
+                suffix = (name or "").strip() or chat_id
+                config = {
+                    "trades": f"{sheets.TRADES_SHEET} {suffix}",
+                    "holdings": f"{sheets.HOLDINGS_SHEET} {suffix}",
+                }
+                if self._sheets_in_use(config.values()):
+                    raise ValueError(f"The name '{suffix}' is already used by another chat")
+                self._config[chat_id] = config
+                self._save()
+        return self.get(chat_id)
+
+    def _sheets_in_use(self, titles):
+        # Sheet titles are unique regardless of case.
+        used = {sheets.TRADES_SHEET.casefold(), sheets.HOLDINGS_SHEET.casefold()}
+        for cfg in self._config.values():
+            used.update(t.casefold() for t in cfg.values())
+        return any(t.casefold() in used for t in titles)
+
+    def unsubscribe(self, chat_id):
+        """Stops serving a chat (its worksheets are left in place)."""
+        chat_id = str(chat_id)
+        with self._lock:
+            if chat_id not in self._config:
+                return False
+            del self._config[chat_id]
+            self._chats.pop(chat_id, None)
+            self._save()
+            return True
+
+    def all(self):
+        """Every served chat, primary first."""
+        with self._lock:
+            ids = [self.primary_id] + [c for c in self._config if c != self.primary_id]
+        return [self.get(c) for c in ids]
+
+    def for_sheet(self, title):
+        """Chats whose Trades worksheet is ``title``."""
+        return [c for c in self.all() if c.trades_sheet == title]
@@ -1,14 +1,17 @@
 import os
 import json
-import base64
 import streamlit as st
-import yfinance as yf
-import matplotlib.pyplot as plt
 import numpy as np
-import matplotlib.dates as mdates
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+
+import charts
+import historystore
+import ledger
+import pnl
+import quotes
+import ratematrix
+import sheets
+import windows
 
 st.set_page_config(page_title="SGD FX Tracker", layout="wide")
 st.title("Currency Value Tracker (SGD as base)")
@@ -23,322 +26,292 @@ with open(PAIRS_FILE) as _f:
 # -----------------------------
 # Google Sheets
 # -----------------------------
-def get_gsheet():
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    b64 = os.environ.get("GOOGLE_SERVICE_ACCOUNT", "")
-    if not b64:
-        return None
-    info = json.loads(base64.b64decode(b64))
-    creds = Credentials.from_service_account_info(info, scopes=scopes)
-    gc = gspread.authorize(creds)
-    sheet_id = os.environ.get("GOOGLE_SHEET_ID", "")
-    if not sheet_id:
-        return None
-    return gc.open_by_key(sheet_id)
+@st.cache_resource
+def get_ledger():
+    return ledger.Ledger()
 
 @st.cache_data(ttl=120)
 def load_trades():
     try:
-        sp = get_gsheet()
-        if sp is None:
+        if not sheets.is_configured():
             return []
-        ws = sp.worksheet("Trades")
-        return ws.get_all_records()
+        return get_ledger().trades()
     except Exception:
         return []
 
+@st.cache_data(ttl=120)
+def load_holdings():
+    try:
+        if not sheets.is_configured():
+            return {}
+        return get_ledger().holdings()
+    except Exception:
+        return {}
+
 # -----------------------------
-# Helpers
+# Market data: one cached multi-ticker fetch of 2 months of daily closes;
+# every metric, chart and recommendation below is a slice of it
 # -----------------------------
-def _close_series(df):
-    if df.empty:
-        return None
-    s = df.get("Close")
-    if s is None:
-        return None
-    if hasattr(s, "columns"):
-        s = s.iloc[:, 0]
-    s = s.dropna()
-    return s if not s.empty else None
-
 @st.cache_data(ttl=300)
-def fetch_last_close(ticker: str):
-    df = yf.download(ticker, period="5d", interval="1d", progress=False)
-    s = _close_series(df)
-    if s is None:
-        return None, None
-    last = float(s.iloc[-1])
-    prev = float(s.iloc[-2]) if len(s) > 1 else None
-    return last, prev
+def load_closes(tickers):
+    """Daily closes (dates x tickers) over the trailing 2 months."""
+    closes = quotes.fetch_closes(tickers)
+    return pd.DataFrame({t: s for t, s in closes.items() if s is not None}).reindex(columns=list(tickers))
 
-@st.cache_data(ttl=300)
-def fetch_30d_history(ticker: str):
-    return yf.download(ticker, period="1mo", interval="1d", progress=False)
+def pair_closes(closes, ticker):
+    """One ticker's closes from the shared frame (empty if unavailable)."""
+    if ticker not in closes:
+        return pd.Series(dtype=float)
+    return closes[ticker].dropna()
 
-@st.cache_data(ttl=300)
-def fetch_60d_history(ticker: str):
-    return yf.download(ticker, period="2mo", interval="5d", progress=False)
+def last_days(s, period):
+    return s[s.index >= historystore.period_start(period)]
 
-@st.cache_data(ttl=300)
-def fetch_2mo_high(ticker: str):
-    df = yf.download(ticker, period="2mo", interval="1d", progress=False)
-    s = _close_series(df)
-    if s is None:
-        return None
-    return float(s.max())
-
-@st.cache_data(ttl=300)
 def get_market_rate(from_ccy, to_ccy):
-    ticker = f"{from_ccy}{to_ccy}=X"
-    try:
-        df = yf.download(ticker, period="5d", interval="1d", progress=False)
-        s = _close_series(df)
-        if s is None:
-            return None
-        return float(s.iloc[-1])
-    except Exception:
-        return None
+    return RATES.rate(from_ccy, to_ccy)
 
 # -----------------------------
-# Quick metrics for SGD -> majors
+# Interactive sections. Each is a fragment, so changing its widgets reruns
+# only that section instead of the whole page.
 # -----------------------------
-st.subheader("Today's rates — 1 SGD buys…")
-cols = st.columns(len(PAIRS))
-for i, (ccy, ticker) in enumerate(PAIRS.items()):
-    last, prev = fetch_last_close(ticker)
-    with cols[i]:
-        if last is None:
-            st.metric(label=f"{ccy}", value="—", delta="n/a")
+@st.fragment
+def pair_explorer(closes):
+    with st.expander("Explore any 60-day trend"):
+        pick = st.selectbox("Pick a pair", list(PAIRS.keys()))
+        tkr = PAIRS[pick]
+        hist = pair_closes(closes, tkr).iloc[::-5].iloc[::-1]  # every 5th daily bar, ending on the latest
+        if hist.empty:
+            st.error("No data available.")
         else:
-            delta = None if prev is None else (last - prev)
-            st.metric(label=f"{ccy}", value=f"{last:.4f}", delta=f"{delta:+.4f}" if delta is not None else "n/a")
+            st.image(charts.line_chart(tkr, "60d", hist, f"SGD → {pick} (Last 60 Days)"))
+
+@st.fragment
+def thirty_day_trends(closes):
+    st.subheader("Last 30 days (all pairs)")
+    # Only the selected pair is rendered (tabs would draw every chart on every rerun).
+    ccy = st.radio("Pair", list(PAIRS.keys()), horizontal=True, label_visibility="collapsed")
+    ticker = PAIRS[ccy]
+    hist = last_days(pair_closes(closes, ticker), "1mo")
+    if hist.empty:
+        st.error(f"No data for SGD{ccy}.")
+    else:
+        with st.spinner("Rendering chart…"):
+            png = charts.line_chart(ticker, "30d", hist, f"SGD → {ccy} (Last 30 Days)")
+        st.image(png)
+
+@st.fragment
+def ad_hoc_lookup(rates, sgd_rates):
+    st.subheader("Ad-hoc pair lookup (any to any)")
+    currencies_list = ["SGD"] + list(PAIRS.keys())
+    base_currency = st.selectbox("Base:", currencies_list, index=currencies_list.index("SGD"))
+    target_currency = st.selectbox("Target:", currencies_list, index=currencies_list.index("USD"))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Get Exchange Rate"):
+            rate = rates.rate(base_currency, target_currency)
+            if rate:
+                st.success(f"1 {base_currency} = {rate:.4f} {target_currency}")
+            else:
+                st.error("Could not fetch rate for this pair.")
+
+    with col2:
+        if st.button("Show Last 30 Days Trend"):
+            # Crosses are derived from the SGD-based series, no extra download.
+            hist = pd.Series(dtype=float)
+            if base_currency in sgd_rates and target_currency in sgd_rates:
+                hist = last_days((sgd_rates[target_currency] / sgd_rates[base_currency]).dropna(), "1mo")
+            if hist.empty:
+                st.error("No data available for the selected currency pair.")
+            else:
+                st.image(charts.line_chart(
+                    f"{base_currency}{target_currency}", "30d", hist,
+                    f"{base_currency} to {target_currency} (Last 30 Days)", ylabel="Exchange Rate",
+                ))
 
-st.caption("Higher numbers are better for SGD (you get more foreign currency per 1 SGD).")
+# -----------------------------
+# Page layout. Every section gets a placeholder in page order and is filled
+# as soon as its data is in: the tracked pairs' rates and charts first, the
+# trade history next, and the sections that need trades priced at current
+# rates last, so the page fills in instead of waiting on the slowest load.
+# -----------------------------
+metrics_box = st.container()
+portfolio_box = st.container()
+history_box = st.container()
+recs_box = st.container()
+explorer_box = st.container()
+trends_box = st.container()
+st.divider()
+lookup_box = st.container()
+
+with portfolio_box:
+    st.header("📊 Portfolio")
+with history_box:
+    st.header("📜 Trade History")
+with recs_box:
+    st.header("💡 Trade Recommendations")
 
 # -----------------------------
-# Portfolio Summary
+# Quick metrics for SGD -> majors
 # -----------------------------
-st.header("📊 Portfolio")
-trades = load_trades()
-
-if trades:
-    col_portfolio, col_stats = st.columns(2)
-
-    with col_portfolio:
-        st.subheader("Holdings")
-        holdings = {}
-        total_sgd_spent = 0.0
-        for r in trades:
-            to_ccy = r.get("To", "")
-            converted = float(r.get("Converted", 0) or 0)
-            amount = float(r.get("Amount", 0) or 0)
-            from_ccy = r.get("From", "")
-            if from_ccy == "SGD":
-                total_sgd_spent += amount
-            holdings[to_ccy] = holdings.get(to_ccy, 0.0) + converted
-
-        total_current_value = 0.0
-        for ccy, amt in sorted(holdings.items()):
-            current_rate = get_market_rate("SGD", ccy)
-            if current_rate:
-                sgd_val = amt / current_rate
-                total_current_value += sgd_val
-                st.metric(label=f"{ccy}", value=f"{amt:,.2f}", delta=f"≈ {sgd_val:,.2f} SGD")
+PAIR_TICKERS = tuple(sorted(set(PAIRS.values())))
+with metrics_box:
+    st.subheader("Today's rates — 1 SGD buys…")
+    with st.spinner("Loading market data…"):
+        PAIR_CLOSES = load_closes(PAIR_TICKERS)
+    cols = st.columns(len(PAIRS))
+    for i, (ccy, ticker) in enumerate(PAIRS.items()):
+        q = quotes.summarize(PAIR_CLOSES[ticker]) if ticker in PAIR_CLOSES else None
+        with cols[i]:
+            if q is None:
+                st.metric(label=f"{ccy}", value="—", delta="n/a")
             else:
-                st.metric(label=f"{ccy}", value=f"{amt:,.2f}", delta="rate unavailable")
+                last, prev = q["last"], q["prev"]
+                delta = None if prev is None else (last - prev)
+                st.metric(label=f"{ccy}", value=f"{last:.4f}", delta=f"{delta:+.4f}" if delta is not None else "n/a")
+
+    st.caption("Higher numbers are better for SGD (you get more foreign currency per 1 SGD).")
 
-    with col_stats:
-        st.subheader("Summary")
-        total_pnl = total_current_value - total_sgd_spent
-        pnl_pct = (total_pnl / total_sgd_spent * 100) if total_sgd_spent else 0
-        st.metric("Total SGD Exchanged", f"{total_sgd_spent:,.2f}")
-        st.metric("Current Value (SGD)", f"{total_current_value:,.2f}", delta=f"{total_pnl:+,.2f} ({pnl_pct:+.2f}%)")
-else:
-    st.info("No trades recorded yet. Use the Telegram bot /exchange command to log trades.")
+with explorer_box:
+    pair_explorer(PAIR_CLOSES)
+with trends_box:
+    thirty_day_trends(PAIR_CLOSES)
 
 # -----------------------------
 # Trade History
 # -----------------------------
-st.header("📜 Trade History")
-if trades:
-    trade_df = pd.DataFrame(trades)
-    display_cols = ["Date", "From", "To", "Amount", "Rate", "Converted", "Market Rate", "Spread %", "Notes"]
-    available_cols = [c for c in display_cols if c in trade_df.columns]
-    st.dataframe(trade_df[available_cols], use_container_width=True, hide_index=True)
-else:
-    st.info("No trades to display.")
+with history_box:
+    with st.spinner("Loading trades…"):
+        trades = load_trades()
+        holdings = load_holdings()
+    if trades:
+        trade_df = pd.DataFrame(trades)
+        display_cols = ["Date", "From", "To", "Amount", "Rate", "Converted", "Market Rate", "Spread %", "Notes"]
+        available_cols = [c for c in display_cols if c in trade_df.columns]
+        st.dataframe(trade_df[available_cols], use_container_width=True, hide_index=True)
+    else:
+        st.info("No trades to display.")
 
 # -----------------------------
-# Recommendations
+# Rates for every traded currency (only tickers beyond the tracked pairs
+# are fetched here); the rate matrix, windows and P&L are slices of it
 # -----------------------------
-st.header("💡 Trade Recommendations")
-
-if trades:
-    positions = {}
-    for r in trades:
-        from_ccy = r.get("From", "")
-        to_ccy = r.get("To", "")
-        amount = float(r.get("Amount", 0) or 0)
-        converted = float(r.get("Converted", 0) or 0)
-        rate = float(r.get("Rate", 0) or 0)
-        if not from_ccy or not to_ccy or rate == 0:
-            continue
-        key = (from_ccy, to_ccy)
-        if key not in positions:
-            positions[key] = []
-        positions[key].append({
-            "date": r.get("Date", ""),
-            "amount": amount,
-            "converted": converted,
-            "rate": rate,
-        })
-
-    reverse_tab, forward_tab = st.tabs(["🔄 Convert Back (Take Profit)", "📈 Buy More (Near 2-Mo High)"])
-
-    with reverse_tab:
-        has_reverse = False
-        for (from_ccy, to_ccy), pos_trades in positions.items():
-            total_converted = sum(t["converted"] for t in pos_trades)
-            total_original = sum(t["amount"] for t in pos_trades)
-            current_reverse_rate = get_market_rate(to_ccy, from_ccy)
-            current_forward_rate = get_market_rate(from_ccy, to_ccy)
-            if current_reverse_rate is None or total_original == 0:
-                continue
-            convert_back = total_converted * current_reverse_rate
-            profit = convert_back - total_original
-            profit_pct = profit / total_original * 100
-            if profit <= 0:
-                continue
-
-            has_reverse = True
-            with st.expander(f"🟢 {to_ccy} → {from_ccy} | Profit: {profit:+,.2f} {from_ccy} ({profit_pct:+.2f}%)", expanded=True):
-                c1, c2, c3 = st.columns(3)
-                c1.metric("Holding", f"{total_converted:,.2f} {to_ccy}")
-                c2.metric("Convert Back Now", f"{convert_back:,.2f} {from_ccy}")
-                c3.metric("Profit", f"{profit:+,.2f} {from_ccy}", delta=f"{profit_pct:+.2f}%")
-
-                st.markdown("**Original trades:**")
-                for t in pos_trades:
-                    t_back = t["converted"] * current_reverse_rate
-                    t_profit = t_back - t["amount"]
-                    date_short = t["date"][:10] if t["date"] else "?"
-                    st.markdown(
-                        f"- `{date_short}`: {t['amount']:,.2f} {from_ccy} → "
-                        f"{t['converted']:,.2f} {to_ccy} @ {t['rate']:.4f} "
-                        f"→ now worth **{t_back:,.2f} {from_ccy}** ({t_profit:+,.2f})"
-                    )
-
-        if not has_reverse:
-            st.info("No profitable reverse trades at current rates.")
-
-    with forward_tab:
-        has_forward = False
-        for (from_ccy, to_ccy), pos_trades in positions.items():
-            if from_ccy != "SGD":
-                continue
-            total_converted = sum(t["converted"] for t in pos_trades)
-            total_original = sum(t["amount"] for t in pos_trades)
-            avg_rate = total_converted / total_original if total_original else 0
-            current_rate = get_market_rate(from_ccy, to_ccy)
-            two_mo_high = fetch_2mo_high(PAIRS.get(to_ccy, f"SGD{to_ccy}=X"))
-            if current_rate is None or two_mo_high is None:
-                continue
-            pct_of_high = current_rate / two_mo_high * 100
-            if pct_of_high < 98:
-                continue
-
-            has_forward = True
-            with st.expander(f"🟢 SGD → {to_ccy} | {pct_of_high:.1f}% of 2-mo high", expanded=True):
-                c1, c2, c3 = st.columns(3)
-                c1.metric("Current Rate", f"{current_rate:.4f}")
-                c2.metric("2-Month High", f"{two_mo_high:.4f}")
-                c3.metric("Your Avg Rate", f"{avg_rate:.4f}", delta=f"{(current_rate - avg_rate) / avg_rate * 100:+.2f}% vs avg")
-                st.progress(min(pct_of_high / 100, 1.0))
-                st.caption(f"Rate is at {pct_of_high:.1f}% of the 2-month high — good time to buy more {to_ccy}")
-
-        if not has_forward:
-            st.info("No currencies near their 2-month high right now.")
-
-else:
-    st.info("Log trades via the Telegram bot to see recommendations.")
+BOOK = pnl.TradeBook(trades)
+_trade_ccys = {r.get(k, "") for r in trades for k in ("From", "To")} | set(holdings)
+RATE_PAIRS = ratematrix.rate_pairs(PAIRS, {c for c in _trade_ccys if c})
+_extra = (set(RATE_PAIRS.values()) | ratematrix.direct_quote_tickers()) - set(PAIR_TICKERS)
+CLOSES = PAIR_CLOSES
+if _extra:
+    with portfolio_box:
+        with st.spinner("Pricing holdings…"):
+            CLOSES = pd.concat([PAIR_CLOSES, load_closes(tuple(sorted(_extra)))], axis=1)
+MARKET = {t: quotes.summarize(CLOSES[t]) for t in CLOSES}
+RATES = ratematrix.build_rate_matrix(RATE_PAIRS, MARKET)
+WINDOW = windows.window_stats(CLOSES)
+SGD_RATES = ratematrix.sgd_frame(RATE_PAIRS, CLOSES)
 
 # -----------------------------
-# Per-pair explorer
+# Portfolio Summary
 # -----------------------------
-with st.expander("Explore any 60-day trend"):
-    pick = st.selectbox("Pick a pair", list(PAIRS.keys()))
-    tkr = PAIRS[pick]
-    hist = fetch_60d_history(tkr)
-    if hist.empty:
-        st.error("No data available.")
+with portfolio_box:
+    if holdings:
+        col_portfolio, col_stats = st.columns(2)
+        holding_pnl = pnl.holdings_pnl(holdings, BOOK, RATES)
+
+        with col_portfolio:
+            st.subheader("Holdings")
+            for h in holding_pnl:
+                if h["current_value_sgd"] is not None:
+                    st.metric(label=h["ccy"], value=f"{h['amount']:,.2f}", delta=f"≈ {h['current_value_sgd']:,.2f} SGD")
+                else:
+                    st.metric(label=h["ccy"], value=f"{h['amount']:,.2f}", delta="rate unavailable")
+
+        with col_stats:
+            st.subheader("Summary")
+            total_sgd_spent = sum(p["amount"] for p in BOOK.pairs(from_ccy="SGD").values())
+            total_current_value = sum(h["current_value_sgd"] or 0 for h in holding_pnl)
+            total_cost = sum(h["cost_sgd"] for h in holding_pnl if h["pnl"] is not None)
+            st.metric("Total SGD Exchanged", f"{total_sgd_spent:,.2f}")
+            if total_cost > 0:
+                total_pnl = sum(h["pnl"] for h in holding_pnl if h["pnl"] is not None)
+                st.metric("Current Value (SGD)", f"{total_current_value:,.2f}", delta=f"{total_pnl:+,.2f} ({total_pnl / total_cost * 100:+.2f}%)")
+            else:
+                st.metric("Current Value (SGD)", f"{total_current_value:,.2f}")
+    elif trades:
+        st.info("No holdings set yet. Use the Telegram bot /sethold command to record what you hold.")
     else:
-        fig, ax = plt.subplots(figsize=(10, 5))
-        ax.plot(hist.index, hist["Close"], marker="o", linestyle="-")
-        ax.set_title(f"SGD → {pick} (Last 60 Days)", fontsize=12)
-        ax.set_xlabel("Date", fontsize=10)
-        ax.set_ylabel("Exchange Rate (per 1 SGD)", fontsize=10)
-        ax.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d"))
-        plt.setp(ax.get_xticklabels(), fontsize=8)
-        ax.grid(True)
-        st.pyplot(fig)
+        st.info("No trades recorded yet. Use the Telegram bot /exchange command to log trades.")
 
 # -----------------------------
-# 30-day trends
+# Recommendations
 # -----------------------------
-st.subheader("Last 30 days (all pairs)")
-tabs = st.tabs(list(PAIRS.keys()))
-for tab, (ccy, ticker) in zip(tabs, PAIRS.items()):
-    with tab:
-        hist = fetch_30d_history(ticker)
-        if hist.empty:
-            st.error(f"No data for SGD{ccy}.")
-        else:
-            fig, ax = plt.subplots(figsize=(10, 5))
-            ax.plot(hist.index, hist["Close"], marker="o", linestyle="-")
-            ax.set_title(f"SGD → {ccy} (Last 30 Days)", fontsize=12)
-            ax.set_xlabel("Date", fontsize=10)
-            ax.set_ylabel("Exchange Rate (per 1 SGD)", fontsize=10)
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d"))
-            plt.setp(ax.get_xticklabels(), fontsize=8)
-            ax.grid(True)
-            st.pyplot(fig)
+with recs_box:
+    if trades:
+        reverse_tab, forward_tab = st.tabs(["🔄 Convert Back (Take Profit)", "📈 Buy More (Near 2-Mo High)"])
+
+        with reverse_tab:
+            has_reverse = False
+            for (from_ccy, to_ccy), pos in BOOK.pair_pnl(RATES).items():
+                total_converted = pos["converted"]
+                current_reverse_rate = pos["reverse_rate"]
+                convert_back = pos["convert_back"]
+                profit = pos["profit"]
+                profit_pct = pos["profit_pct"]
+                if pos["amount"] == 0 or profit <= 0:
+                    continue
+
+                has_reverse = True
+                with st.expander(f"🟢 {to_ccy} → {from_ccy} | Profit: {profit:+,.2f} {from_ccy} ({profit_pct:+.2f}%)", expanded=True):
+                    c1, c2, c3 = st.columns(3)
+                    c1.metric("Holding", f"{total_converted:,.2f} {to_ccy}")
+                    c2.metric("Convert Back Now", f"{convert_back:,.2f} {from_ccy}")
+                    c3.metric("Profit", f"{profit:+,.2f} {from_ccy}", delta=f"{profit_pct:+.2f}%")
+
+                    st.markdown("**Original trades:**")
+                    for t in BOOK.trades(from_ccy, to_ccy):
+                        t_back = t["converted"] * current_reverse_rate
+                        t_profit = t_back - t["amount"]
+                        date_short = t["date"][:10] if t["date"] else "?"
+                        st.markdown(
+                            f"- `{date_short}`: {t['amount']:,.2f} {from_ccy} → "
+                            f"{t['converted']:,.2f} {to_ccy} @ {t['rate']:.4f} "
+                            f"→ now worth **{t_back:,.2f} {from_ccy}** ({t_profit:+,.2f})"
+                        )
+
+            if not has_reverse:
+                st.info("No profitable reverse trades at current rates.")
+
+        with forward_tab:
+            has_forward = False
+            buy_positions = BOOK.pairs(from_ccy="SGD")
+            for (from_ccy, to_ccy), pos in buy_positions.items():
+                avg_rate = pos["avg_rate"]
+                current_rate = get_market_rate(from_ccy, to_ccy)
+                w = WINDOW.get(RATE_PAIRS.get(to_ccy))
+                if current_rate is None or w is None:
+                    continue
+                two_mo_high = w["high"]
+                pct_of_high = w["pct_of_high"]
+                if pct_of_high < 98:
+                    continue
+
+                has_forward = True
+                with st.expander(f"🟢 SGD → {to_ccy} | {pct_of_high:.1f}% of 2-mo high", expanded=True):
+                    c1, c2, c3 = st.columns(3)
+                    c1.metric("Current Rate", f"{current_rate:.4f}")
+                    c2.metric("2-Month High", f"{two_mo_high:.4f}")
+                    c3.metric("Your Avg Rate", f"{avg_rate:.4f}", delta=f"{(current_rate - avg_rate) / avg_rate * 100:+.2f}% vs avg")
+                    st.progress(min(pct_of_high / 100, 1.0))
+                    st.caption(f"Rate is at {pct_of_high:.1f}% of the 2-month high — good time to buy more {to_ccy}")
+
+            if not has_forward:
+                st.info("No currencies near their 2-month high right now.")
+
+    else:
+        st.info("Log trades via the Telegram bot to see recommendations.")
 
 # -----------------------------
 # Ad-hoc pair lookup
 # -----------------------------
-st.divider()
-st.subheader("Ad-hoc pair lookup (any to any)")
-currencies_list = ["SGD"] + list(PAIRS.keys())
-base_currency = st.selectbox("Base:", currencies_list, index=currencies_list.index("SGD"))
-target_currency = st.selectbox("Target:", currencies_list, index=currencies_list.index("USD"))
-ad_hoc_ticker = f"{base_currency}{target_currency}=X"
-
-col1, col2 = st.columns(2)
-with col1:
-    if st.button("Get Exchange Rate"):
-        rate = get_market_rate(base_currency, target_currency)
-        if rate:
-            st.success(f"1 {base_currency} = {rate:.4f} {target_currency}")
-        else:
-            st.error("Could not fetch rate for this pair.")
-
-with col2:
-    if st.button("Show Last 30 Days Trend"):
-        hist = fetch_30d_history(ad_hoc_ticker)
-        if hist.empty:
-            st.error("No data available for the selected currency pair.")
-        else:
-            fig, ax = plt.subplots(figsize=(10, 5))
-            s = _close_series(hist)
-            if s is not None:
-                ax.plot(s.index, s.values, marker="o", linestyle="-")
-            ax.set_title(f"{base_currency} to {target_currency} (Last 30 Days)")
-            ax.set_xlabel("Date", fontsize=10)
-            ax.set_ylabel("Exchange Rate", fontsize=10)
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%m-%d"))
-            plt.setp(ax.get_xticklabels(), fontsize=8)
-            ax.grid(True)
-            st.pyplot(fig)
+with lookup_box:
+    ad_hoc_lookup(RATES, SGD_RATES)
@@ -0,0 +1,174 @@
+"""Persistent on-disk daily OHLC history, one memory-mapped file per ticker.
+
+Each ticker's bars live in ``HISTORY_DIR/<ticker>.npy`` as a structured
+NumPy array (date, open, high, low, close) sorted by date and opened with
+``mmap_mode="r"``. ``top_up`` downloads only the bars from the last stored
+date onwards (the last bar is re-fetched because today's bar keeps moving),
+batched into one multi-ticker request per start date. New tickers are
+seeded with ``HISTORY_SEED_PERIOD`` of history. Files are replaced
+atomically, so a restart picks up where the last process left off and a
+reader never sees a half-written file.
+"""
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+import breaker
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DIR = os.environ.get("HISTORY_DIR", "history")
+HISTORY_SEED_PERIOD = os.environ.get("HISTORY_SEED_PERIOD", "2y")
+HISTORY_TOPUP_INTERVAL = float(os.environ.get("HISTORY_TOPUP_INTERVAL", 300))
+
+BAR_DTYPE = np.dtype([
+    ("date", "datetime64[D]"),
+    ("open", "f8"),
+    ("high", "f8"),
+    ("low", "f8"),
+    ("close", "f8"),
+])
+FIELDS = {"open": "Open", "high": "High", "low": "Low", "close": "Close"}
+
+_PERIOD_UNITS = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+
+
+def period_start(period, today=None):
+    """``"2mo"`` -> the first date inside a trailing 2-month window."""
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    for suffix, unit in _PERIOD_UNITS.items():
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            return today - pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+    raise ValueError(f"Unsupported period: {period}")
+
+
+class HistoryStore:
+    def __init__(self, root=HISTORY_DIR, download=None):
+        """``download(tickers, start=None, period=None)`` must return
+        ``{"Open"|"High"|"Low"|"Close": DataFrame dates x tickers}``."""
+        self.root = root
+        self._download = download
+        self._lock = threading.Lock()
+        self._topup_lock = threading.Lock()
+        self._bars = {}  # ticker -> memory-mapped bar array
+        self._checked_at = {}  # ticker -> monotonic time of last top-up
+
+    def _path(self, ticker):
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in ticker)
+        return os.path.join(self.root, f"{safe}.npy")
+
+    def bars(self, ticker):
+        """All stored bars for ``ticker`` (empty array if none)."""
+        with self._lock:
+            bars = self._bars.get(ticker)
+            if bars is None:
+                path = self._path(ticker)
+                if os.path.exists(path):
+                    bars = np.load(path, mmap_mode="r")
+                else:
+                    bars = np.empty(0, dtype=BAR_DTYPE)
+                self._bars[ticker] = bars
+            return bars
+
+    def last_date(self, ticker):
+        bars = self.bars(ticker)
+        return bars["date"][-1] if len(bars) else None
+
+    def refreshed_at(self, ticker):
+        """Wall-clock time the provider last returned bars for ``ticker``
+        (every top-up that gets data rewrites the file), or None."""
+        try:
+            return os.path.getmtime(self._path(ticker))
+        except OSError:
+            return None
+
+    def _write(self, ticker, bars):
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(ticker)
+        tmp = f"{path}.tmp.npy"
+        np.save(tmp, bars)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bars[ticker] = np.load(path, mmap_mode="r")
+
+    def _merge(self, ticker, frames):
+        """Stores the ticker's downloaded bars; returns False if there were none."""
+        closes = frames["Close"].get(ticker) if "Close" in frames else None
+        if closes is None:
+            return False
+        closes = closes.dropna()
+        if closes.empty:
+            return False
+        new = np.empty(len(closes), dtype=BAR_DTYPE)
+        new["date"] = closes.index.values.astype("datetime64[D]")
+        for field, col in FIELDS.items():
+            frame = frames.get(col)
+            values = frame[ticker].reindex(closes.index) if frame is not None and ticker in frame else closes
+            new[field] = values.to_numpy(dtype=float)
+        old = self.bars(ticker)
+        keep = old[old["date"] < new["date"][0]] if len(old) else old
+        self._write(ticker, np.concatenate([keep, new]))
+        return True
+
+    def top_up(self, tickers, force=False):
+        """Fetches bars newer than what's on disk for every ticker, at most
+        once per ``HISTORY_TOPUP_INTERVAL`` unless ``force``. Tickers that
+        got no bars (a failed or skipped download) are tried again next time."""
+        with self._topup_lock:
+            self._top_up(tickers, force)
+
+    def _top_up(self, tickers, force):
+        now = time.monotonic()
+        due = [
+            t for t in set(tickers)
+            if force or now - self._checked_at.get(t, float("-inf")) >= HISTORY_TOPUP_INTERVAL
+        ]
+        if not due or self._download is None:
+            return
+
+        # Group by resume date so tickers in the same state share one request.
+        groups = {}
+        for t in due:
+            last = self.last_date(t)
+            start = None if last is None else str(last)
+            groups.setdefault(start, []).append(t)
+
+        for i, (start, group) in enumerate(groups.items()):
+            try:
+                # Each remaining request gets an equal share of the command's deadline.
+                with breaker.share(len(groups) - i):
+                    if start is None:
+                        frames = self._download(group, period=HISTORY_SEED_PERIOD)
+                    else:
+                        frames = self._download(group, start=start)
+            except Exception as e:
+                logger.warning(f"History top-up failed for {group}: {e}")
+                continue
+            for t in group:
+                try:
+                    if self._merge(t, frames):
+                        self._checked_at[t] = now
+                except Exception as e:
+                    logger.warning(f"Could not store history for {t}: {e}")
+
+    def frame(self, ticker, period=None):
+        """Stored bars as a DataFrame (Open/High/Low/Close), optionally
+        limited to a trailing ``period`` such as ``"1mo"``."""
+        bars = self.bars(ticker)
+        if period is not None and len(bars):
+            cutoff = np.datetime64(period_start(period).date(), "D")
+            bars = bars[bars["date"] >= cutoff]
+        index = pd.DatetimeIndex(bars["date"].astype("datetime64[ns]"), name="Date")
+        return pd.DataFrame({col: np.asarray(bars[f]) for f, col in FIELDS.items()}, index=index)
+
+    def closes(self, tickers, period=None):
+        """Closes for several tickers as one DataFrame (dates x tickers)."""
+        tickers = sorted(set(tickers))
+        series = {t: self.frame(t, period)["Close"] for t in tickers}
+        if not series:
+            return pd.DataFrame()
+        return pd.DataFrame(series).reindex(columns=tickers)
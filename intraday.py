@@ -0,0 +1,98 @@
+"""Intraday monitoring: push alerts as soon as a pair crosses a level.
+
+Every ``INTRADAY_POLL`` seconds, today's ``INTRADAY_BAR`` bars for all
+tickers watched by any chat are fetched in one batched request. Only bars
+newer than the last one seen for each ticker are checked, against each
+chat's two levels for that ticker:
+
+* ``near_high``: the close reaches 98% of the 2-month daily high (SGD buys
+  close to the most foreign currency it has in two months).
+* ``take_profit``: the close falls to the rate at which converting the
+  holding back to SGD is worth more than it cost.
+
+An alert fires when a level is crossed, not on every bar beyond it. The
+level re-arms only after the price moves back past it by ``REARM_PCT``, and
+each (chat, ticker, level) alerts at most once per day, so a price hovering
+around a level doesn't spam the chat. Bars from before the first poll are only used
+to learn which levels are already crossed.
+"""
+import os
+import logging
+import threading
+
+import quotes
+
+logger = logging.getLogger(__name__)
+
+INTRADAY_POLL = float(os.environ.get("INTRADAY_POLL", 0))  # seconds; 0 disables
+INTRADAY_BAR = os.environ.get("INTRADAY_BAR", "5m")
+NEAR_HIGH_PCT = 98.0
+REARM_PCT = 0.2
+
+# level -> True if the price must be at or above it (False: at or below)
+LEVELS = {"near_high": True, "take_profit": False}
+
+
+def download_today(tickers, bar=INTRADAY_BAR):
+    """Today's intraday closes (bars x tickers) in one request."""
+    return quotes.download_closes(tickers, period="1d", interval=bar)
+
+
+class IntradayMonitor:
+    def __init__(self, download=download_today):
+        self._download = download
+        self._lock = threading.Lock()
+        self.last_seen = {}  # ticker -> timestamp of the newest bar processed
+        self.active = set()  # (chat_id, ticker, level) currently past their level
+        self.alerted = {}  # (chat_id, ticker, level) -> date of the last alert
+
+    def poll(self, levels):
+        """Checks new bars against each chat's ``levels`` (``{chat_id: {ticker:
+        {"near_high": price or None, "take_profit": price or None}}}``) and
+        returns the alerts: dicts with chat_id, ticker, level, price,
+        threshold and time."""
+        tickers = sorted({t for by_ticker in levels.values() for t in by_ticker})
+        if not tickers:
+            return []
+        closes = self._download(tickers)
+        alerts = []
+        with self._lock:
+            for ticker in tickers:
+                if ticker not in closes:
+                    continue
+                s = closes[ticker].dropna()
+                seen = self.last_seen.get(ticker)
+                new = s if seen is None else s[s.index > seen]
+                if new.empty:
+                    continue
+                self.last_seen[ticker] = new.index[-1]
+                for ts, price in new.items():
+                    for chat_id, by_ticker in levels.items():
+                        thresholds = by_ticker.get(ticker)
+                        if thresholds:
+                            alerts.extend(self._check(chat_id, ticker, ts, float(price), thresholds,
+                                                      quiet=seen is None))
+        return alerts
+
+    def _check(self, chat_id, ticker, ts, price, thresholds, quiet):
+        alerts = []
+        for level, above in LEVELS.items():
+            threshold = thresholds.get(level)
+            if not threshold:
+                continue
+            key = (chat_id, ticker, level)
+            crossed = price >= threshold if above else price <= threshold
+            if crossed and key not in self.active:
+                self.active.add(key)
+                if quiet or self.alerted.get(key) == ts.date():
+                    continue
+                self.alerted[key] = ts.date()
+                alerts.append({
+                    "chat_id": chat_id, "ticker": ticker, "level": level, "price": price,
+                    "threshold": threshold, "time": ts,
+                })
+            elif not crossed and key in self.active:
+                margin = threshold * REARM_PCT / 100
+                if (price < threshold - margin) if above else (price > threshold + margin):
+                    self.active.discard(key)
+        return alerts
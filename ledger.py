@@ -0,0 +1,284 @@
+"""Local SQLite mirror of the Trades and Holdings worksheets.
+
+Reads are served from the local database instead of ``get_all_records()``
+on the whole sheet. Syncing is incremental: only rows appended to Trades
+since the last sync are fetched (one ranged read), and a full reconcile runs
+every ``LEDGER_RECONCILE_INTERVAL`` seconds to pick up edits and deletions
+made directly in the sheet. Holdings is small and user-edited, so it is
+re-read in full on every sync.
+"""
+import os
+import time
+import logging
+import sqlite3
+import threading
+
+import sheets
+
+logger = logging.getLogger(__name__)
+
+LEDGER_DB = os.environ.get("LEDGER_DB", "ledger.db")
+LEDGER_SYNC_INTERVAL = float(os.environ.get("LEDGER_SYNC_INTERVAL", 30))
+LEDGER_RECONCILE_INTERVAL = float(os.environ.get("LEDGER_RECONCILE_INTERVAL", 3600))
+
+# Trades sheet header -> local column
+TRADE_COLUMNS = {
+    "Date": "date",
+    "From": "from_ccy",
+    "To": "to_ccy",
+    "Amount": "amount",
+    "Rate": "rate",
+    "Converted": "converted",
+    "Notes": "notes",
+    "Market Rate": "market_rate",
+    "Spread %": "spread_pct",
+}
+_TEXT_COLUMNS = {"date", "from_ccy", "to_ccy", "notes"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    sheet TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    date TEXT,
+    from_ccy TEXT,
+    to_ccy TEXT,
+    amount NUMERIC,
+    rate NUMERIC,
+    converted NUMERIC,
+    notes TEXT,
+    market_rate NUMERIC,
+    spread_pct NUMERIC,
+    PRIMARY KEY (sheet, row)
+);
+CREATE TABLE IF NOT EXISTS holdings (
+    sheet TEXT NOT NULL,
+    ccy TEXT NOT NULL,
+    amount REAL NOT NULL,
+    avg_cost REAL,
+    PRIMARY KEY (sheet, ccy)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    sheet TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    synced_at REAL NOT NULL,
+    reconciled_at REAL NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def _num(value):
+    """Sheet cell -> int/float like gspread's numericise, None for blanks."""
+    if value in ("", None):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    text = str(value).replace(",", "").strip()
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return None
+
+
+def _col_letter(n):
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+class Ledger:
+    """Mirror of one Trades/Holdings worksheet pair in a local SQLite file."""
+
+    def __init__(self, trades_sheet=sheets.TRADES_SHEET, holdings_sheet=sheets.HOLDINGS_SHEET,
+                 path=LEDGER_DB):
+        self.trades_sheet = trades_sheet
+        self.holdings_sheet = holdings_sheet
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(sync_state)")}
+        if "revision" not in columns:  # ledger files created before it was tracked
+            self._db.execute("ALTER TABLE sync_state ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        self._header = None
+        self._dirty = True
+
+    @property
+    def revision(self):
+        """Bumped when a full reconcile finds rows that were edited or deleted
+        in the sheet (appends don't count), so derived state can rebuild.
+        Stored with the sync state, so a reconcile run by another process
+        sharing the file (e.g. the dashboard) is seen here too."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT revision FROM sync_state WHERE sheet = ?", (self.trades_sheet,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    # --------------- Sheets -> SQLite ---------------
+
+    def _trades_ws(self):
+        return sheets.worksheet(self.trades_sheet, sheets.TRADES_HEADER, rows=1000, cols=10)
+
+    def _holdings_ws(self):
+        return sheets.worksheet(self.holdings_sheet, sheets.HOLDINGS_HEADER, rows=100, cols=3)
+
+    def _state(self):
+        row = self._db.execute(
+            "SELECT rows, synced_at, reconciled_at FROM sync_state WHERE sheet = ?",
+            (self.trades_sheet,),
+        ).fetchone()
+        return row if row else (0, 0.0, 0.0)
+
+    def _to_record(self, values):
+        rec = {}
+        for i, name in enumerate(self._header):
+            col = TRADE_COLUMNS.get(name)
+            if col is None:
+                continue
+            value = values[i] if i < len(values) else ""
+            rec[col] = str(value) if col in _TEXT_COLUMNS else _num(value)
+        return rec
+
+    def _insert_trades(self, first_row, rows):
+        cols = list(TRADE_COLUMNS.values())
+        sql = (
+            f"INSERT OR REPLACE INTO trades (sheet, row, {', '.join(cols)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in cols)})"
+        )
+        params = []
+        for offset, values in enumerate(rows):
+            if not any(str(v).strip() for v in values):
+                continue
+            rec = self._to_record(values)
+            params.append([self.trades_sheet, first_row + offset] + [rec.get(c) for c in cols])
+        self._db.executemany(sql, params)
+
+    def _sync_trades(self, full):
+        ws = self._trades_ws()
+        rows, _, reconciled_at = self._state()
+        now = time.time()
+        if full:
+            values = ws.get_all_values()
+            self._header = values[0] if values else list(sheets.TRADES_HEADER)
+            data = values[1:]
+            snapshot = f"SELECT * FROM trades WHERE sheet = ? AND row <= {rows} ORDER BY row"
+            with self._db:
+                before = self._db.execute(snapshot, (self.trades_sheet,)).fetchall()
+                self._db.execute("DELETE FROM trades WHERE sheet = ?", (self.trades_sheet,))
+                self._insert_trades(1, data)
+                self._save_state(len(data), now, now)
+                after = self._db.execute(snapshot, (self.trades_sheet,)).fetchall()
+                if before != after:
+                    self._db.execute(
+                        "UPDATE sync_state SET revision = revision + 1 WHERE sheet = ?",
+                        (self.trades_sheet,),
+                    )
+            return
+
+        if self._header is None:
+            self._header = ws.row_values(1) or list(sheets.TRADES_HEADER)
+        last_col = _col_letter(len(self._header))
+        data = ws.get(f"A{rows + 2}:{last_col}")
+        with self._db:
+            self._insert_trades(rows + 1, data)
+            self._save_state(rows + len(data), now, reconciled_at)
+
+    def _save_state(self, rows, synced_at, reconciled_at):
+        self._db.execute(
+            "INSERT INTO sync_state (sheet, rows, synced_at, reconciled_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (sheet) DO UPDATE SET rows = excluded.rows, "
+            "synced_at = excluded.synced_at, reconciled_at = excluded.reconciled_at",
+            (self.trades_sheet, rows, synced_at, reconciled_at),
+        )
+
+    def _sync_holdings(self):
+        records = self._holdings_ws().get_all_records()
+        params = []
+        for r in records:
+            ccy = str(r.get("Currency", "")).upper().strip()
+            amount = _num(r.get("Amount", 0)) or 0
+            cost = _num(r.get("Avg SGD Cost (optional)", ""))
+            if ccy and amount > 0:
+                params.append((self.holdings_sheet, ccy, amount, cost))
+        with self._db:
+            self._db.execute("DELETE FROM holdings WHERE sheet = ?", (self.holdings_sheet,))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO holdings (sheet, ccy, amount, avg_cost) VALUES (?, ?, ?, ?)",
+                params,
+            )
+
+    def sync(self, full=False):
+        """Pulls new Trades rows (or everything, if ``full``) and the Holdings sheet."""
+        with self._lock:
+            _, _, reconciled_at = self._state()
+            full = full or time.time() - reconciled_at >= LEDGER_RECONCILE_INTERVAL
+            self._sync_trades(full)
+            self._sync_holdings()
+            self._dirty = False
+
+    def mark_dirty(self):
+        """Forces the next read to sync, e.g. right after the bot wrote to a sheet."""
+        self._dirty = True
+
+    def ensure_fresh(self):
+        with self._lock:
+            _, synced_at, _ = self._state()
+            if self._dirty or time.time() - synced_at >= LEDGER_SYNC_INTERVAL:
+                try:
+                    self.sync()
+                except Exception as e:
+                    logger.warning(f"Ledger sync failed, serving local copy: {e}")
+
+    # --------------- Queries ---------------
+
+    def _records(self, where="", params=(), with_row=False):
+        cols = list(TRADE_COLUMNS.values())
+        sql = f"SELECT row, {', '.join(cols)} FROM trades WHERE sheet = ? {where} ORDER BY row"
+        with self._lock:
+            rows = self._db.execute(sql, (self.trades_sheet, *params)).fetchall()
+        names = list(TRADE_COLUMNS)
+        records = [
+            (row[0], {name: ("" if v is None else v) for name, v in zip(names, row[1:])})
+            for row in rows
+        ]
+        return records if with_row else [rec for _, rec in records]
+
+    def trades(self):
+        """All trades as Trades-sheet style records, oldest first."""
+        self.ensure_fresh()
+        return self._records()
+
+    def trades_since(self, row=0):
+        """``[(data_row, record), ...]`` for Trades rows after data row ``row``."""
+        self.ensure_fresh()
+        return self._records("AND row > ?", (row,), with_row=True)
+
+    def trade_page(self, page=1, per_page=10):
+        """Returns ``(records, total_rows)`` for one page counting back from
+        the newest row (page 1 = the last ``per_page`` sheet rows), oldest
+        first. Pages are sheet-row ranges read off the primary key, so the
+        cost stays flat as the history grows."""
+        self.ensure_fresh()
+        with self._lock:
+            total = self._state()[0]
+        hi = total - (page - 1) * per_page
+        lo = max(hi - per_page, 0)
+        if hi <= 0:
+            return [], total
+        return self._records("AND row > ? AND row <= ?", (lo, hi)), total
+
+    def holdings(self):
+        """``{ccy: {"amount": ..., "avg_cost": ... or None}}`` from the Holdings mirror."""
+        self.ensure_fresh()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT ccy, amount, avg_cost FROM holdings WHERE sheet = ?",
+                (self.holdings_sheet,),
+            ).fetchall()
+        return {ccy: {"amount": amount, "avg_cost": cost} for ccy, amount, cost in rows}
@@ -0,0 +1,235 @@
+"""Latency histograms and call / error counters for commands and external calls.
+
+Bot handlers and jobs, ``yf.download`` and every Google Sheets worksheet
+request are timed into fixed-bucket histograms labelled by what was called.
+A histogram's count is the call counter, and failures are also counted
+separately. ``/stats`` summarises them, and with ``METRICS_PORT`` set, they
+are served in Prometheus text format at ``/metrics``.
+
+With ``METRICS_ENABLED=0``, ``instrument`` and ``wrap`` return what they
+were given unchanged and ``timer`` returns a shared no-op context manager.
+Instrumented code then runs exactly as it would without this module.
+"""
+import os
+import time
+import asyncio
+import bisect
+import logging
+import threading
+import functools
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))  # 0: no HTTP endpoint
+
+# Upper bounds in seconds, Prometheus style (the last bucket is +Inf).
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# name -> help text
+FAMILIES = {
+    "command": "Bot command handler latency",
+    "job": "Scheduled job latency",
+    "external": "External API call latency (Yahoo Finance, Google Sheets)",
+}
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = [0] * (len(BUCKETS) + 1)  # per bucket, not cumulative
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds, error=False):
+        i = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.buckets[i] += 1
+            self.count += 1
+            self.sum += seconds
+            self.min = min(self.min, seconds)
+            self.max = max(self.max, seconds)
+            if error:
+                self.errors += 1
+
+    def quantile(self, q):
+        """Estimate of the ``q`` quantile, interpolated within its bucket and
+        clamped to the smallest / largest value observed."""
+        with self._lock:
+            counts, total, low, high = list(self.buckets), self.count, self.min, self.max
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for i, n in enumerate(counts):
+            if seen + n >= rank and n:
+                lo = BUCKETS[i - 1] if i else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else high
+                return min(max(lo + (hi - lo) * (rank - seen) / n, low), high)
+            seen += n
+        return high
+
+
+_lock = threading.Lock()
+_series = {}  # (name, sorted label items) -> Histogram
+
+
+def histogram(name, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    h = _series.get(key)
+    if h is None:
+        with _lock:
+            h = _series.setdefault(key, Histogram())
+    return h
+
+
+class _Timer:
+    __slots__ = ("hist", "start")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.hist.observe(time.perf_counter() - self.start, error=exc_type is not None)
+        return False
+
+
+def timer(name, **labels):
+    """``with timer("external", service="yahoo", op="download"): ...``"""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _Timer(histogram(name, **labels))
+
+
+def instrument(func, name, **labels):
+    """``func`` (sync or async) timed into the ``name`` histogram."""
+    if not METRICS_ENABLED:
+        return func
+    hist = histogram(name, **labels)
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def timed(*args, **kwargs):
+            with _Timer(hist):
+                return await func(*args, **kwargs)
+    else:
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with _Timer(hist):
+                return func(*args, **kwargs)
+    return timed
+
+
+class _Wrapped:
+    """Proxy timing the listed methods of ``target``; everything else passes through."""
+
+    def __init__(self, target, methods, name, labels):
+        self._target = target
+        self._methods = methods
+        self._name = name
+        self._labels = labels
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if attr in self._methods and callable(value):
+            return instrument(value, self._name, op=attr, **self._labels)
+        return value
+
+
+def wrap(target, methods, name="external", **labels):
+    """``target`` with each method in ``methods`` timed under an ``op`` label."""
+    if not METRICS_ENABLED:
+        return target
+    return _Wrapped(target, frozenset(methods), name, labels)
+
+
+# --------------- Reporting ---------------
+
+def summary():
+    """One dict per series: name, labels, count, errors, mean / p50 / p95 seconds."""
+    with _lock:
+        items = sorted(_series.items())
+    rows = []
+    for (name, labels), h in items:
+        if not h.count:
+            continue
+        rows.append({
+            "name": name,
+            "labels": dict(labels),
+            "count": h.count,
+            "errors": h.errors,
+            "mean": h.sum / h.count,
+            "p50": h.quantile(0.5),
+            "p95": h.quantile(0.95),
+        })
+    return rows
+
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    """All series in the Prometheus text exposition format."""
+    with _lock:
+        items = sorted(_series.items())
+    lines = []
+    for family, help_text in FAMILIES.items():
+        series = [(labels, h) for (name, labels), h in items if name == family]
+        if not series:
+            continue
+        metric = f"fxbot_{family}_seconds"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, h in series:
+            with h._lock:
+                counts, total, sum_ = list(h.buckets), h.count, h.sum
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += n
+                lines.append(f"{metric}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{_label_text(labels)} {sum_:.6f}")
+            lines.append(f"{metric}_count{_label_text(labels)} {total}")
+        errors_metric = f"fxbot_{family}_errors_total"
+        lines.append(f"# HELP {errors_metric} Calls counted in {metric} that raised")
+        lines.append(f"# TYPE {errors_metric} counter")
+        for labels, h in series:
+            lines.append(f"{errors_metric}{_label_text(labels)} {h.errors}")
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=METRICS_PORT):
+    """Serves ``/metrics`` on ``port`` from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer(("", port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving Prometheus metrics on :{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,157 @@
+"""Cost basis and P&L shared by the bot and the dashboard.
+
+``TradeBook`` parses the Trades records once into typed NumPy columns and
+groups them by (from, to) pair with ``np.unique``/``np.bincount``, so the
+totals and average rates for every pair come out of a single pass instead of
+one scan of the trade list per currency. ``holdings_pnl`` values all
+holdings against the rate matrix at once. ``/portfolio``, ``/holdings``,
+``/recommend`` and the dashboard all go through here, so they always agree.
+"""
+import numpy as np
+
+BASE = "SGD"
+
+
+def to_float(value):
+    """Sheet cell -> float (thousands separators allowed), 0.0 for blanks or text."""
+    if value in ("", None):
+        return 0.0
+    try:
+        return float(str(value).replace(",", ""))
+    except ValueError:
+        return 0.0
+
+
+class TradeBook:
+    """Trades-sheet records as typed columns, grouped by currency pair."""
+
+    def __init__(self, rows):
+        self.date = np.array([str(r.get("Date", "")) for r in rows], dtype=object)
+        self.from_ccy = np.array([str(r.get("From", "")) for r in rows], dtype=object)
+        self.to_ccy = np.array([str(r.get("To", "")) for r in rows], dtype=object)
+        self.amount = np.array([to_float(r.get("Amount")) for r in rows], dtype=float)
+        self.converted = np.array([to_float(r.get("Converted")) for r in rows], dtype=float)
+        self.rate = np.array([to_float(r.get("Rate")) for r in rows], dtype=float)
+        # Trades that count towards cost basis: both currencies set, a rate
+        # was recorded and something was received.
+        self.valid = (
+            (self.from_ccy != "") & (self.to_ccy != "")
+            & (self.rate != 0) & (self.converted > 0)
+        )
+        self._pairs = self._group()
+
+    def __len__(self):
+        return len(self.amount)
+
+    def _group(self):
+        if not self.valid.any():
+            return {}
+        keys = np.array(
+            [f"{f}/{t}" for f, t in zip(self.from_ccy[self.valid], self.to_ccy[self.valid])]
+        )
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        amount = np.bincount(inverse, weights=self.amount[self.valid], minlength=len(uniq))
+        converted = np.bincount(inverse, weights=self.converted[self.valid], minlength=len(uniq))
+        count = np.bincount(inverse, minlength=len(uniq))
+        pairs = {}
+        for i, key in enumerate(uniq):
+            from_ccy, to_ccy = key.split("/", 1)
+            pairs[(from_ccy, to_ccy)] = {
+                "amount": float(amount[i]),  # total spent, in from_ccy
+                "converted": float(converted[i]),  # total received, in to_ccy
+                "count": int(count[i]),
+                "avg_rate": float(converted[i] / amount[i]) if amount[i] else 0.0,
+            }
+        return pairs
+
+    def pairs(self, from_ccy=None):
+        """``{(from, to): {"amount", "converted", "count", "avg_rate"}}``."""
+        if from_ccy is None:
+            return dict(self._pairs)
+        return {k: v for k, v in self._pairs.items() if k[0] == from_ccy}
+
+    def avg_cost(self, ccy, base=BASE):
+        """Average ``base`` paid per unit of ``ccy`` across base -> ccy trades."""
+        p = self._pairs.get((base, ccy))
+        if not p or p["converted"] <= 0:
+            return None
+        return p["amount"] / p["converted"]
+
+    def trades(self, from_ccy, to_ccy):
+        """Individual valid trades for one pair, oldest first."""
+        mask = self.valid & (self.from_ccy == from_ccy) & (self.to_ccy == to_ccy)
+        return [
+            {"date": d, "amount": float(a), "converted": float(c), "rate": float(r)}
+            for d, a, c, r in zip(
+                self.date[mask], self.amount[mask], self.converted[mask], self.rate[mask]
+            )
+        ]
+
+    def pair_pnl(self, rates):
+        """Value of everything received on each pair if converted back now:
+        ``{(from, to): {..., "reverse_rate", "convert_back", "profit", "profit_pct"}}``."""
+        if not self._pairs:
+            return {}
+        keys = list(self._pairs)
+        spent = np.array([self._pairs[k]["amount"] for k in keys])
+        got = np.array([self._pairs[k]["converted"] for k in keys])
+        reverse = np.array([rates.rate(t, f) or np.nan for f, t in keys])
+        back = got * reverse
+        profit = back - spent
+        pct = np.divide(profit * 100, spent, out=np.full_like(profit, np.nan), where=spent != 0)
+        out = {}
+        for i, k in enumerate(keys):
+            if np.isnan(reverse[i]):
+                continue
+            out[k] = dict(
+                self._pairs[k],
+                reverse_rate=float(reverse[i]),
+                convert_back=float(back[i]),
+                profit=float(profit[i]),
+                profit_pct=float(pct[i]),
+            )
+        return out
+
+
+def holdings_pnl(holdings, book, rates, base=BASE):
+    """Unrealized P&L for ``holdings`` (``{ccy: {"amount", "avg_cost"}}``).
+
+    Holdings without an avg cost fall back to the book's average buy rate.
+    Returns one dict per currency, sorted by currency, with ``None`` for
+    values that can't be computed (no rate, or no cost basis).
+    """
+    ccys = sorted(holdings)
+    if not ccys:
+        return []
+    amount = np.array([holdings[c]["amount"] for c in ccys], dtype=float)
+    given = np.array(
+        [np.nan if holdings[c]["avg_cost"] is None else holdings[c]["avg_cost"] for c in ccys],
+        dtype=float,
+    )
+    estimated = np.isnan(given)
+    fallback = np.array([book.avg_cost(c, base) or np.nan for c in ccys], dtype=float)
+    cost_rate = np.where(estimated, fallback, given)
+    reverse = rates.rates_to(ccys, base)
+
+    value = amount * reverse
+    cost = np.where(cost_rate > 0, amount * cost_rate, np.nan)
+    pnl = value - cost
+    pct = np.divide(pnl * 100, cost, out=np.full_like(pnl, np.nan), where=cost > 0)
+
+    def _f(x):
+        return None if np.isnan(x) else float(x)
+
+    return [
+        {
+            "ccy": c,
+            "amount": float(amount[i]),
+            "avg_cost_rate": _f(cost_rate[i]),
+            "cost_is_estimated": bool(estimated[i]),
+            "reverse_rate": _f(reverse[i]),
+            "current_value_sgd": _f(value[i]),
+            "cost_sgd": _f(cost[i]),
+            "pnl": _f(pnl[i]),
+            "pnl_pct": _f(pct[i]),
+        }
+        for i, c in enumerate(ccys)
+    ]
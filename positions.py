@@ -0,0 +1,245 @@
+"""Lot-based positions with realized and unrealized P&L.
+
+Every currency holds a queue of lots (units, SGD cost). Buying with SGD adds
+a lot; selling back to SGD takes units off the oldest lots (``COST_METHOD=
+fifo``) or off a single pooled lot (``COST_METHOD=average``) and books the
+difference between the SGD received and the lots' cost as realized P&L.
+A cross trade (e.g. USD -> JPY) moves the cost of the units it consumes
+onto the new currency, so P&L is only realized when money comes back to
+SGD. Units sold without a known cost (money held before tracking started)
+carry a NaN cost and realize nothing.
+
+Each trade is applied in O(1) amortized time: a lot is appended once and
+popped once. State is checkpointed to ``POSITIONS_FILE`` together with the
+last ledger row it covers, so a restart only replays trades added since.
+Trades logged by the bot are applied once they reach the ledger: the trade
+writer marks it dirty after each append, so the next ``catch_up`` sees them.
+"""
+import os
+import json
+import math
+import logging
+import threading
+from collections import deque
+
+import pnl
+
+logger = logging.getLogger(__name__)
+
+COST_METHOD = os.environ.get("COST_METHOD", "fifo").lower()
+POSITIONS_FILE = os.environ.get("POSITIONS_FILE", "positions.json")
+POSITIONS_CHECKPOINT_INTERVAL = float(os.environ.get("POSITIONS_CHECKPOINT_INTERVAL", 300))
+EPS = 1e-9
+
+
+def trade_key(record):
+    """Identity of a Trades record, used to recognise trades already applied."""
+    return "|".join([
+        str(record.get("Date", "")),
+        str(record.get("From", "")),
+        str(record.get("To", "")),
+        f"{pnl.to_float(record.get('Amount')):.6f}",
+        f"{pnl.to_float(record.get('Converted')):.6f}",
+    ])
+
+
+class Position:
+    """Lots held in one currency. Lots with a NaN cost (unknown basis) are
+    kept out of ``cost``/``known_units``."""
+
+    def __init__(self, lots=(), realized=0.0):
+        self.lots = deque()  # [units, SGD cost]
+        self.units = self.known_units = self.cost = 0.0
+        self.realized = realized
+        for units, cost in lots:
+            self.add(float(units), float(cost))
+
+    def add(self, units, cost, pooled=False):
+        if pooled and self.lots:
+            lot = self.lots[0]
+            lot[0] += units
+            lot[1] += cost
+        else:
+            lot = [units, cost]
+            self.lots.append(lot)
+        self.units += units
+        if not math.isnan(lot[1]):
+            self.known_units += units
+            self.cost += cost
+        elif pooled:
+            # The pooled lot mixed in units of unknown cost; all of it is unknown now.
+            self.known_units = self.cost = 0.0
+
+    def take(self, units):
+        """Removes ``units`` from the oldest lots; returns ``(matched, cost)``
+        where ``cost`` is NaN if any of the units had an unknown cost."""
+        matched = cost = 0.0
+        while units > EPS and self.lots:
+            lot = self.lots[0]
+            n = min(units, lot[0])
+            c = lot[1] * n / lot[0]
+            lot[0] -= n
+            lot[1] -= c
+            if lot[0] <= EPS:
+                self.lots.popleft()
+            if not math.isnan(c):
+                self.known_units -= n
+                self.cost -= c
+            matched += n
+            cost += c
+            units -= n
+        self.units -= matched
+        return matched, cost
+
+
+class PositionBook:
+    def __init__(self, method=COST_METHOD, path=POSITIONS_FILE):
+        if method not in ("fifo", "average"):
+            raise ValueError(f"Unknown COST_METHOD: {method}")
+        self.method = method
+        self.path = path
+        self._lock = threading.RLock()
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        self.positions = {}
+        self.synced_row = 0  # last ledger data row applied
+        self.synced_key = None  # trade_key of that row, to detect sheet edits
+        self.ledger_revision = None  # Ledger.revision the book was last checked against
+        self.dirty = True
+
+    # --------------- Applying trades ---------------
+
+    def _position(self, ccy):
+        return self.positions.setdefault(ccy, Position())
+
+    def apply(self, record):
+        """Applies one Trades record. Rows missing currencies or amounts are ignored."""
+        from_ccy = str(record.get("From", "")).upper()
+        to_ccy = str(record.get("To", "")).upper()
+        amount = pnl.to_float(record.get("Amount"))
+        converted = pnl.to_float(record.get("Converted"))
+        if not from_ccy or not to_ccy or from_ccy == to_ccy or amount <= 0 or converted <= 0:
+            return
+        pooled = self.method == "average"
+        with self._lock:
+            if from_ccy == pnl.BASE:
+                self._position(to_ccy).add(converted, amount, pooled)
+            else:
+                pos = self._position(from_ccy)
+                matched, cost = pos.take(amount)
+                unknown = amount - matched
+                if to_ccy == pnl.BASE:
+                    # Only the units with a known cost realize P&L.
+                    proceeds = converted * matched / amount
+                    if matched > EPS and not math.isnan(cost):
+                        pos.realized += proceeds - cost
+                else:
+                    if unknown > EPS:
+                        cost = math.nan
+                    self._position(to_ccy).add(converted, cost, pooled)
+                if unknown > EPS:
+                    logger.debug(f"{unknown:,.2f} {from_ccy} sold without a known cost basis")
+            self.dirty = True
+
+    def catch_up(self, ledger):
+        """Applies Trades rows the ledger has gained since the last call. If
+        rows the book already covers were edited or deleted in the sheet, the
+        book is rebuilt from the whole ledger."""
+        with self._lock:
+            start = max(self.synced_row - 1, 0)
+            rows = ledger.trades_since(start)
+            seen, self.ledger_revision = self.ledger_revision, ledger.revision
+            if seen != self.ledger_revision:
+                self.dirty = True
+                if seen is not None:
+                    self._rebuild(ledger)
+                    return
+            if self.synced_row:
+                if not rows or rows[0][0] != self.synced_row or trade_key(rows[0][1]) != self.synced_key:
+                    self._rebuild(ledger)
+                    return
+                rows = rows[1:]
+            self._apply_rows(rows)
+
+    def _apply_rows(self, rows):
+        for row, rec in rows:
+            self.apply(rec)
+            self.synced_row, self.synced_key = row, trade_key(rec)
+            self.dirty = True
+
+    def _rebuild(self, ledger):
+        logger.info("Trades sheet changed under the position book; rebuilding from the ledger")
+        revision = self.ledger_revision
+        self._reset()
+        self.ledger_revision = revision
+        self._apply_rows(ledger.trades_since(0))
+
+    # --------------- Views ---------------
+
+    def holdings(self):
+        """``{ccy: {"amount", "avg_cost"}}`` in the same shape as the ledger's
+        Holdings mirror; ``avg_cost`` is None when part of the cost is unknown."""
+        with self._lock:
+            out = {}
+            for ccy, pos in sorted(self.positions.items()):
+                if pos.units <= EPS:
+                    continue
+                known = pos.units - pos.known_units <= EPS
+                out[ccy] = {"amount": pos.units, "avg_cost": pos.cost / pos.units if known else None}
+            return out
+
+    def realized(self):
+        """``{ccy: realized P&L in SGD}`` for currencies with any realized P&L."""
+        with self._lock:
+            return {ccy: pos.realized for ccy, pos in sorted(self.positions.items()) if pos.realized}
+
+    # --------------- Checkpoint ---------------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable position checkpoint {self.path}: {e}")
+            return
+        if state.get("method") != self.method:
+            logger.info(f"Cost method changed to {self.method}; positions will be rebuilt")
+            return
+        if state.get("provisional"):
+            # Older checkpoints included trades applied ahead of the ledger.
+            logger.info("Checkpoint includes trades not yet in the ledger; positions will be rebuilt")
+            return
+        self.positions = {
+            ccy: Position(p["lots"], p["realized"]) for ccy, p in state["positions"].items()
+        }
+        self.synced_row = state["synced_row"]
+        self.synced_key = state["synced_key"]
+        self.ledger_revision = state.get("ledger_revision")
+        self.dirty = False
+
+    def checkpoint(self):
+        """Atomically writes the book to ``path`` if it changed since the last write."""
+        with self._lock:
+            if not self.dirty:
+                return
+            state = {
+                "method": self.method,
+                "synced_row": self.synced_row,
+                "synced_key": self.synced_key,
+                "ledger_revision": self.ledger_revision,
+                "positions": {
+                    ccy: {"lots": [list(lot) for lot in pos.lots], "realized": pos.realized}
+                    for ccy, pos in self.positions.items()
+                },
+            }
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self.dirty = False
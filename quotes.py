@@ -0,0 +1,418 @@
+"""Batched Yahoo Finance quote layer shared by the bot and the dashboard.
+
+Every tracked ticker's daily history is pulled in a single multi-ticker
+``yf.download`` call, and the per-pair numbers (last / previous close,
+2-month high, inverse rate) are all derived from that one frame.
+
+Downloads go through an in-process TTL cache so repeated lookups of the same
+ticker (within one command or across concurrent ones) share a single fetch.
+Daily bars are persisted in a local history store (``historystore.py``), so
+cache misses only download the bars since the last stored date. When a
+fresh snapshot has been published (``snapshot.py``), cache misses read it
+instead of going to the network at all.
+
+Every cached quote carries the time the provider last returned data for it.
+Once a quote is past ``QUOTE_CACHE_TTL`` it is still served immediately,
+together with its age, while a refresh runs in the background. Only
+quotes older than ``QUOTE_MAX_STALENESS`` are refused. Lookups with nothing
+usable cached wait at most ``QUOTE_LATENCY_BUDGET`` seconds for the download,
+so a slow or failing provider can't hold up a command.
+"""
+import os
+import time
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pandas as pd
+import yfinance as yf
+
+import breaker
+import historystore
+import metrics
+import snapshot
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PERIOD = "2mo"
+QUOTE_CACHE_TTL = float(os.environ.get("QUOTE_CACHE_TTL", 300))
+QUOTE_CACHE_SIZE = int(os.environ.get("QUOTE_CACHE_SIZE", 256))
+QUOTE_MAX_STALENESS = float(os.environ.get("QUOTE_MAX_STALENESS", 6 * 3600))
+QUOTE_LATENCY_BUDGET = float(os.environ.get("QUOTE_LATENCY_BUDGET", 10))  # 0: wait as long as it takes
+# After a failed refresh, a stale quote is retried this often rather than on every lookup.
+QUOTE_RETRY_INTERVAL = 30
+# yfinance error messages that mean Yahoo couldn't be reached or refused the
+# request, as opposed to having no data for a ticker (a typo, a delisting).
+TRANSPORT_ERRORS = (
+    "curl:", "Timeout", "timed out", "Connection", "DNSError", "SSLError",
+    "ProxyError", "RateLimit", "Too Many Requests",
+)
+
+
+class _YahooErrors(logging.Handler):
+    """Collects the errors yfinance logs on the current thread: ``yf.download``
+    reports failed tickers that way (as one line each) instead of raising."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self._local = threading.local()
+
+    @contextmanager
+    def capture(self):
+        self._local.lines = lines = []
+        try:
+            yield lines
+        finally:
+            self._local.lines = None
+
+    def emit(self, record):
+        lines = getattr(self._local, "lines", None)
+        if lines is not None:
+            lines.append(record.getMessage())
+
+
+_yahoo_errors = _YahooErrors()
+logging.getLogger("yfinance").addHandler(_yahoo_errors)
+
+
+def close_series(df):
+    """Single-ticker Close column as a NaN-free Series (handles MultiIndex)."""
+    if df is None or df.empty:
+        return None
+    s = df.get("Close")
+    if s is None:
+        return None
+    if hasattr(s, "columns"):
+        s = s.iloc[:, 0]
+    s = s.dropna()
+    return s if not s.empty else None
+
+
+def download_bars(tickers, period=HISTORY_PERIOD, interval="1d", start=None, end=None):
+    """OHLC bars for all ``tickers`` from one multi-ticker request.
+
+    Covers ``period``, or ``start``..``end`` (``YYYY-MM-DD``, end exclusive)
+    when ``start`` is given. Returns ``{"Open"|"High"|"Low"|"Close":
+    DataFrame}``, each indexed by date with one column per ticker. Tickers
+    Yahoo has no data for come back as all-NaN columns rather than raising.
+
+    This is the only place ``yf.download`` is called. It is guarded by the
+    Yahoo circuit breaker and the current deadline (``breaker.py``): when
+    either says no, the request is skipped and the result is empty, exactly
+    as if the download had failed. Only errors reaching Yahoo count against
+    the breaker; tickers it has no data for don't.
+    """
+    tickers = sorted(set(tickers))
+    if not tickers:
+        return {}
+    window = {"start": start, "end": end} if start else {"period": period}
+    df = None
+    timeout = breaker.fetch_timeout()
+    if timeout is None:
+        logger.warning(f"Skipping download of {len(tickers)} tickers: command deadline reached")
+    elif not breaker.YAHOO.allow():
+        logger.info(f"Skipping download of {len(tickers)} tickers: Yahoo breaker is open")
+    else:
+        failed = False
+        try:
+            with metrics.timer("external", service="yahoo", op="download"), _yahoo_errors.capture() as errors:
+                df = yf.download(tickers, interval=interval, progress=False, timeout=timeout, **window)
+        except Exception as e:
+            logger.warning(f"Batch download failed for {len(tickers)} tickers: {e}")
+            df = None
+            failed = True
+        else:
+            # yfinance turns timeouts and connection errors into an empty frame
+            # plus a logged error; an empty frame on its own just means no data.
+            empty = df is None or df.empty or df.get("Close") is None or df["Close"].isna().all(axis=None)
+            failed = empty and any(marker in line for line in errors for marker in TRANSPORT_ERRORS)
+        if failed:
+            breaker.YAHOO.failure()
+        else:
+            breaker.YAHOO.success()
+    frames = {}
+    for field in ("Open", "High", "Low", "Close"):
+        frame = None if df is None or df.empty else df.get(field)
+        if frame is None:
+            frame = pd.DataFrame(columns=tickers, dtype=float)
+        elif isinstance(frame, pd.Series):
+            frame = frame.to_frame(tickers[0])
+        frames[field] = frame.reindex(columns=tickers)
+    return frames
+
+
+def download_closes(tickers, period=HISTORY_PERIOD, interval="1d", start=None, end=None):
+    """Close column of :func:`download_bars` (dates x tickers)."""
+    frames = download_bars(tickers, period=period, interval=interval, start=start, end=end)
+    return frames.get("Close", pd.DataFrame())
+
+
+def summarize(s):
+    """Last/previous close, 2-month highs and inverse rate for one close series."""
+    if s is None:
+        return None
+    s = s.dropna()
+    if s.empty:
+        return None
+    last = float(s.iloc[-1])
+    high = float(s.max())
+    return {
+        "last": last,
+        "prev": float(s.iloc[-2]) if len(s) > 1 else None,
+        "high": high,
+        "prior_high": float(s.iloc[:-1].max()) if len(s) > 1 else high,
+        "inverse": 1 / last if last else None,
+    }
+
+
+class QuoteCache:
+    """TTL + LRU cache of per-ticker close series with single-flight loads and
+    stale-while-revalidate.
+
+    Tickers that are missing or expired are loaded together in one call to
+    ``loader`` (``tickers -> DataFrame of closes``, optionally with
+    ``attrs["as_of"] = {ticker: time the data was fetched}``). While that load
+    is in flight, other threads asking for the same tickers wait on it instead
+    of starting their own download. Expired entries younger than
+    ``max_staleness`` are returned at once and reloaded in the background;
+    lookups that have to wait give up after ``budget`` seconds. Failed loads
+    are not cached and leave the previous entry in place.
+    """
+
+    def __init__(self, loader, ttl=QUOTE_CACHE_TTL, maxsize=QUOTE_CACHE_SIZE,
+                 max_staleness=QUOTE_MAX_STALENESS, budget=QUOTE_LATENCY_BUDGET):
+        self._loader = loader
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_staleness = max_staleness
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # ticker -> (checked_at, as_of, close series)
+        self._inflight = {}  # ticker -> Future resolving to the new entry or None
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="quote-load")
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+        self.timeouts = 0
+
+    def get_many_aged(self, tickers):
+        """Returns ``{ticker: (close series, age in seconds)}`` for every
+        ticker, with ``(None, None)`` where nothing usable is available."""
+        result = {}
+        waiting = {}
+        to_load = []
+        to_refresh = []
+        now = time.time()
+        with self._lock:
+            for t in set(tickers):
+                entry = self._entries.get(t)
+                usable = entry is not None and now - entry[1] <= self.max_staleness
+                if usable:
+                    self._entries.move_to_end(t)
+                    result[t] = (entry[2], now - entry[1])
+                    if now - entry[0] < self.ttl:
+                        self.hits += 1
+                        continue
+                    self.stale += 1
+                    if t not in self._inflight:
+                        self._inflight[t] = Future()
+                        to_refresh.append(t)
+                elif t in self._inflight:
+                    self.coalesced += 1
+                    waiting[t] = self._inflight[t]
+                else:
+                    self.misses += 1
+                    fut = Future()
+                    self._inflight[t] = fut
+                    waiting[t] = fut
+                    to_load.append(t)
+
+        if to_refresh:
+            # Not bound by the caller's deadline: nobody is waiting on it.
+            self._executor.submit(self._load, to_refresh)
+        # Wait no longer than the latency budget or the caller's deadline.
+        budget = self.budget if self.budget > 0 else None
+        left = breaker.time_left()
+        if left is not None:
+            budget = left if budget is None else min(budget, left)
+        if to_load:
+            if budget is not None and budget > 0:
+                # Carries the caller's deadline into the loader thread.
+                self._executor.submit(contextvars.copy_context().run, self._load, to_load)
+            else:
+                self._load(to_load)
+
+        deadline = None if budget is None else time.monotonic() + budget
+        for t, fut in waiting.items():
+            try:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                entry = fut.result(timeout=timeout)
+            except FutureTimeout:
+                with self._lock:
+                    self.timeouts += 1
+                entry = None
+            age = time.time() - entry[1] if entry is not None else None
+            if entry is None or age > self.max_staleness:
+                result[t] = (None, None)
+            else:
+                result[t] = (entry[2], age)
+        return result
+
+    def get_many(self, tickers):
+        """Returns ``{ticker: close series or None}`` for every ticker."""
+        return {t: s for t, (s, _) in self.get_many_aged(tickers).items()}
+
+    def refresh(self, tickers, loader=None):
+        """Reloads ``tickers`` now, cached or not, so entries are renewed before
+        they expire. Readers keep getting the old entry until the new one lands.
+        ``loader`` replaces the cache's own loader for this reload."""
+        to_load = []
+        with self._lock:
+            for t in set(tickers):
+                if t not in self._inflight:
+                    self._inflight[t] = Future()
+                    to_load.append(t)
+        if to_load:
+            self._load(to_load, loader)
+
+    def _load(self, tickers, loader=None):
+        loaded = {}
+        as_of = {}
+        try:
+            closes = (loader or self._loader)(tickers)
+            as_of = closes.attrs.get("as_of", {})
+            for t in tickers:
+                s = closes[t].dropna() if t in closes else None
+                loaded[t] = s if s is not None and not s.empty else None
+        except Exception as e:
+            logger.warning(f"Quote load failed for {tickers}: {e}")
+        finally:
+            now = time.time()
+            with self._lock:
+                for t in tickers:
+                    s = loaded.get(t)
+                    entry = self._entries.get(t)
+                    t_as_of = as_of.get(t) or now
+                    # Stored bars served after a failed download come back with
+                    # the old as_of; that is a failed refresh, not a fresh quote.
+                    stale = (entry is not None and t_as_of <= entry[1]) or now - t_as_of >= self.ttl
+                    if s is not None and stale:
+                        entry = (now - self.ttl + QUOTE_RETRY_INTERVAL, t_as_of, s)
+                        self._entries[t] = entry
+                        self._entries.move_to_end(t)
+                    elif s is not None:
+                        entry = (now, t_as_of, s)
+                        self._entries[t] = entry
+                        self._entries.move_to_end(t)
+                    elif entry is not None:
+                        # Keep serving the old value and retry it in QUOTE_RETRY_INTERVAL.
+                        entry = (now - self.ttl + QUOTE_RETRY_INTERVAL, entry[1], entry[2])
+                        self._entries[t] = entry
+                    self._inflight.pop(t).set_result(entry)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+    def invalidate(self, tickers=None):
+        with self._lock:
+            if tickers is None:
+                self._entries.clear()
+            else:
+                for t in tickers:
+                    self._entries.pop(t, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "stale": self.stale,
+                "timeouts": self.timeouts,
+                "size": len(self._entries),
+            }
+
+
+_store = historystore.HistoryStore(download=download_bars)
+_snapshot = snapshot.Snapshot()
+
+
+def _live_window(tickers, force=False):
+    """Tops up the on-disk history (even within ``HISTORY_TOPUP_INTERVAL`` if
+    ``force``), then serves the 2-month window from it. ``attrs["as_of"]``
+    holds when the provider last returned each ticker, which is older than
+    now if the top-up failed and stored bars were served."""
+    _store.top_up(tickers, force=force)
+    closes = _store.closes(tickers, HISTORY_PERIOD)
+    closes.attrs["as_of"] = {t: _store.refreshed_at(t) for t in tickers}
+    return closes
+
+
+def _load_window(tickers, force=False):
+    """Cache loader: tickers with a fresh published snapshot are read from it
+    (no network); the rest are fetched live."""
+    try:
+        shared = _snapshot.read(tickers)
+    except Exception as e:
+        logger.warning(f"Quote snapshot unreadable, fetching live: {e}")
+        shared = pd.DataFrame()
+    now = time.time()
+    as_of = {t: now - age for t, age in _snapshot.ages(list(shared.columns)).items()}
+    missing = [t for t in tickers if t not in shared]
+    if missing:
+        live = _live_window(missing, force)
+        as_of.update(live.attrs["as_of"])
+        shared = live if shared.empty else pd.concat([shared, live], axis=1)
+    shared.attrs["as_of"] = as_of
+    return shared
+
+
+def publish_snapshot(tickers):
+    """Fetches ``tickers`` live and publishes them to the shared snapshot;
+    returns how many tickers were published."""
+    tickers = sorted(set(tickers))
+    closes = _live_window(tickers)
+    n = _snapshot.publish(closes)
+    _cache.refresh(tickers)  # re-read from the snapshot just published
+    return n
+
+
+_cache = QuoteCache(_load_window)
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+def refresh(tickers):
+    """Renews cached quotes for ``tickers`` ahead of demand (used by warm-up
+    jobs). Tickers not in a fresh snapshot are downloaded even if their
+    history was topped up less than ``HISTORY_TOPUP_INTERVAL`` ago."""
+    _cache.refresh(tickers, loader=functools.partial(_load_window, force=True))
+
+
+def fetch_closes(tickers):
+    """Returns ``{ticker: close series or None}``, served from the cache where fresh."""
+    return _cache.get_many(tickers)
+
+
+def fetch_closes_aged(tickers):
+    """Returns ``{ticker: (close series, age in seconds)}``, ``(None, None)`` if unavailable."""
+    return _cache.get_many_aged(tickers)
+
+
+def fetch_quotes(tickers):
+    """Returns ``{ticker: summary or None}``; cache misses share one batched
+    download. Each summary's ``age`` is the seconds since it was fetched."""
+    result = {}
+    for t, (s, age) in fetch_closes_aged(tickers).items():
+        q = summarize(s)
+        if q is not None:
+            q["age"] = age
+        result[t] = q
+    return result
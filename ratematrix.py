@@ -0,0 +1,170 @@
+"""Cross-rate matrix derived from one vector of SGD-based quotes.
+
+Only ``SGD<CCY>=X`` style tickers are downloaded. With ``v[i]`` = units of
+currency ``i`` per 1 SGD, every rate ``i -> j`` is ``v[j] / v[i]``, so one
+NumPy outer division yields inverses (``USD -> SGD``) and triangulated
+crosses (``EUR -> JPY``) for all tracked currencies at once. Lookups are
+plain index reads.
+
+Pairs where triangulation is too imprecise can be quoted directly by listing
+them in ``DIRECT_QUOTES`` (e.g. ``DIRECT_QUOTES=EURJPY,USDJPY``); their own
+tickers are fetched in the same batch and override the derived cross.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import quotes
+
+BASE = "SGD"
+
+DIRECT_QUOTES = [
+    p.strip().upper()
+    for p in os.environ.get("DIRECT_QUOTES", "").split(",")
+    if len(p.strip()) == 6
+]
+
+
+def parse_ticker(ticker):
+    """``"SGDUSD=X"`` -> ``("SGD", "USD")``."""
+    code = ticker.split("=")[0]
+    return code[:3], code[3:6]
+
+
+def direct_quote_tickers():
+    return {f"{p}=X" for p in DIRECT_QUOTES}
+
+
+def rate_pairs(pairs, ccys=()):
+    """Tracked pairs plus an ``SGD<CCY>=X`` ticker for any other currency in ``ccys``."""
+    extra = {c: f"{BASE}{c}=X" for c in ccys if c and c != BASE and c not in pairs}
+    return {**extra, **pairs}
+
+
+class RateMatrix:
+    """All-pairs FX rates for a set of currencies, derived from SGD quotes."""
+
+    def __init__(self, sgd_rates, overrides=None, ages=None):
+        """``sgd_rates`` maps currency -> units of that currency per 1 SGD;
+        ``ages`` optionally maps currency -> age of its quote in seconds."""
+        self.ages = dict(ages or {})
+        self.currencies = [BASE] + sorted(c for c in sgd_rates if c != BASE)
+        self._index = {c: i for i, c in enumerate(self.currencies)}
+        v = np.array([1.0] + [sgd_rates[c] for c in self.currencies[1:]], dtype=float)
+        v[~(v > 0)] = np.nan
+        # rate(i -> j) = units of j per 1 unit of i
+        self.matrix = v[np.newaxis, :] / v[:, np.newaxis]
+        self.overrides = {}
+        for (from_ccy, to_ccy), rate in (overrides or {}).items():
+            self.set_override(from_ccy, to_ccy, rate)
+
+    def set_override(self, from_ccy, to_ccy, rate):
+        """Pins a directly quoted rate (and its inverse) over the triangulated one."""
+        if not rate or rate <= 0:
+            return
+        self.overrides[(from_ccy, to_ccy)] = float(rate)
+        self.overrides.setdefault((to_ccy, from_ccy), 1 / float(rate))
+
+    def rate(self, from_ccy, to_ccy):
+        """Units of ``to_ccy`` per 1 ``from_ccy``, or None if either side is unknown."""
+        if from_ccy == to_ccy:
+            return 1.0
+        rate = self.overrides.get((from_ccy, to_ccy))
+        if rate is not None:
+            return rate
+        i = self._index.get(from_ccy)
+        j = self._index.get(to_ccy)
+        if i is None or j is None:
+            return None
+        rate = self.matrix[i, j]
+        return None if np.isnan(rate) else float(rate)
+
+    def rates_to(self, from_ccys, to_ccy):
+        """``rate(c, to_ccy)`` for every ``c`` as one float array (NaN where unknown)."""
+        from_ccys = list(from_ccys)
+        out = np.full(len(from_ccys), np.nan)
+        j = self._index.get(to_ccy)
+        idx = np.array([self._index.get(c, -1) for c in from_ccys], dtype=int)
+        known = idx >= 0
+        if j is not None:
+            out[known] = self.matrix[idx[known], j]
+        for k, c in enumerate(from_ccys):
+            if c == to_ccy:
+                out[k] = 1.0
+            elif (c, to_ccy) in self.overrides:
+                out[k] = self.overrides[(c, to_ccy)]
+        return out
+
+    def age(self, *ccys):
+        """Age in seconds of the oldest quote behind rates between ``ccys`` (0 if unknown)."""
+        return max((self.ages.get(c) or 0.0 for c in ccys), default=0.0)
+
+    def __contains__(self, ccy):
+        return ccy in self._index
+
+
+def build_rate_matrix(pairs, market):
+    """Builds a RateMatrix from ``{ccy: ticker}`` and ``{ticker: quote summary}``.
+
+    Pairs quoted against another tracked currency (e.g. ``INR: USDINR=X``
+    added via ``/addpair INR USD``) are chained through that currency's SGD
+    rate.
+    """
+    sgd_rates = {}
+    ages = {}
+    pending = dict(pairs)
+    while pending:
+        resolved = False
+        for ccy, ticker in list(pending.items()):
+            base, _ = parse_ticker(ticker)
+            q = market.get(ticker)
+            if q is None:
+                pending.pop(ccy)
+                resolved = True
+            elif base == BASE:
+                sgd_rates[ccy] = q["last"]
+                ages[ccy] = q.get("age")
+                pending.pop(ccy)
+                resolved = True
+            elif base in sgd_rates:
+                sgd_rates[ccy] = sgd_rates[base] * q["last"]
+                ages[ccy] = max(q.get("age") or 0.0, ages.get(base) or 0.0)
+                pending.pop(ccy)
+                resolved = True
+        if not resolved:
+            break
+
+    overrides = {}
+    for ticker in direct_quote_tickers():
+        q = market.get(ticker)
+        if q is not None:
+            overrides[parse_ticker(ticker)] = q["last"]
+    return RateMatrix(sgd_rates, overrides, ages)
+
+
+def sgd_frame(pairs, closes):
+    """Per-day rates as a dates x currencies frame (units per 1 SGD, with an
+    ``SGD`` column of 1.0), built from a dates x tickers close frame the same
+    way ``build_rate_matrix`` chains non-SGD pairs. A cross series is then just
+    ``frame[to] / frame[from]``."""
+    frame = {BASE: pd.Series(1.0, index=closes.index)}
+    pending = {c: t for c, t in pairs.items() if t in closes}
+    while pending:
+        resolved = False
+        for ccy, ticker in list(pending.items()):
+            base, _ = parse_ticker(ticker)
+            if base in frame:
+                frame[ccy] = frame[base] * closes[ticker]
+                pending.pop(ccy)
+                resolved = True
+        if not resolved:
+            break
+    return pd.DataFrame(frame)
+
+
+def load_rate_matrix(pairs, ccys=()):
+    """Fetches (through the quote cache) and builds the matrix for ``pairs`` + ``ccys``."""
+    all_pairs = rate_pairs(pairs, ccys)
+    market = quotes.fetch_quotes(set(all_pairs.values()) | direct_quote_tickers())
+    return build_rate_matrix(all_pairs, market)
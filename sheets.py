@@ -0,0 +1,109 @@
+"""Long-lived Google Sheets client shared by the bot, dashboard and backfill.
+
+The service account is decoded and authorized once per process. The client
+talks through a single ``AuthorizedSession`` (which refreshes the OAuth token
+on its own before it expires) with a pooled HTTP adapter, and the spreadsheet
+and worksheet handles are cached so commands don't pay auth and metadata
+round-trips on every call.
+"""
+import os
+import json
+import base64
+import logging
+import threading
+
+import gspread
+from google.auth.transport.requests import AuthorizedSession
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+SHEETS_POOL_SIZE = int(os.environ.get("SHEETS_POOL_SIZE", 10))
+
+TRADES_SHEET = "Trades"
+TRADES_HEADER = [
+    "Date", "From", "To", "Amount", "Rate",
+    "Converted", "Notes", "Market Rate", "Spread %",
+]
+HOLDINGS_SHEET = "Holdings"
+HOLDINGS_HEADER = ["Currency", "Amount", "Avg SGD Cost (optional)"]
+
+# Worksheet requests timed under metrics' "external" histogram (service="sheets").
+WORKSHEET_CALLS = (
+    "get_all_records", "get_all_values", "get", "row_values", "col_values",
+    "append_row", "append_rows", "find", "update_cell", "update", "clear", "delete_rows",
+)
+
+_lock = threading.RLock()
+_client = None
+_spreadsheet = None
+_worksheets = {}
+
+
+def is_configured():
+    return bool(os.environ.get("GOOGLE_SERVICE_ACCOUNT") and os.environ.get("GOOGLE_SHEET_ID"))
+
+
+def get_client():
+    global _client
+    with _lock:
+        if _client is None:
+            info = json.loads(base64.b64decode(os.environ["GOOGLE_SERVICE_ACCOUNT"]))
+            creds = Credentials.from_service_account_info(info, scopes=SCOPES)
+            session = AuthorizedSession(creds)
+            adapter = HTTPAdapter(pool_connections=SHEETS_POOL_SIZE, pool_maxsize=SHEETS_POOL_SIZE)
+            session.mount("https://", adapter)
+            _client = gspread.Client(creds, session=session)
+        return _client
+
+
+def get_spreadsheet():
+    global _spreadsheet
+    with _lock:
+        if _spreadsheet is None:
+            with metrics.timer("external", service="sheets", op="open_by_key"):
+                _spreadsheet = get_client().open_by_key(os.environ["GOOGLE_SHEET_ID"])
+        return _spreadsheet
+
+
+def worksheet(title, header=None, rows=1000, cols=10):
+    """Cached handle for ``title``. If ``header`` is given, a missing
+    worksheet is created with it; otherwise WorksheetNotFound propagates."""
+    with _lock:
+        ws = _worksheets.get(title)
+        if ws is None:
+            sp = metrics.wrap(get_spreadsheet(), ("worksheet", "add_worksheet"), service="sheets")
+            try:
+                ws = metrics.wrap(sp.worksheet(title), WORKSHEET_CALLS, service="sheets")
+            except gspread.exceptions.WorksheetNotFound:
+                if header is None:
+                    raise
+                ws = sp.add_worksheet(title=title, rows=rows, cols=cols)
+                ws = metrics.wrap(ws, WORKSHEET_CALLS, service="sheets")
+                ws.append_row(header)
+            _worksheets[title] = ws
+        return ws
+
+
+def trades_sheet():
+    return worksheet(TRADES_SHEET, TRADES_HEADER, rows=1000, cols=10)
+
+
+def holdings_sheet():
+    return worksheet(HOLDINGS_SHEET, HOLDINGS_HEADER, rows=100, cols=3)
+
+
+def reset():
+    """Drops cached handles, e.g. after a worksheet was renamed or deleted."""
+    global _spreadsheet
+    with _lock:
+        _spreadsheet = None
+        _worksheets.clear()
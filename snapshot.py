@@ -0,0 +1,132 @@
+"""Local quote snapshot shared by the bot and the dashboard processes.
+
+A publisher (the bot's snapshot job, or ``python snapshot.py`` on its own)
+downloads the 2-month daily closes of every tracked ticker on a schedule and
+writes them to a SQLite database in WAL mode. Each publish replaces the
+previous snapshot in a single transaction, so readers in other processes
+always see one complete snapshot and never block the writer. Every ticker
+carries the time its data was fetched from the provider; readers take only tickers younger than
+``SNAPSHOT_MAX_AGE`` and fetch the rest live.
+"""
+import os
+import time
+import logging
+import sqlite3
+import threading
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DB = os.environ.get("SNAPSHOT_DB", "snapshot.db")
+SNAPSHOT_INTERVAL = float(os.environ.get("SNAPSHOT_INTERVAL", 300))
+SNAPSHOT_MAX_AGE = float(os.environ.get("SNAPSHOT_MAX_AGE", 900))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS closes (
+    ticker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    close REAL NOT NULL,
+    PRIMARY KEY (ticker, date)
+);
+CREATE TABLE IF NOT EXISTS published (
+    ticker TEXT PRIMARY KEY,
+    published_at REAL NOT NULL
+);
+"""
+
+
+class Snapshot:
+    def __init__(self, path=SNAPSHOT_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _conn(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def publish(self, closes):
+        """Replaces the snapshot of every column in ``closes`` (dates x tickers).
+        Tickers are stamped with ``closes.attrs["as_of"]`` where given (when
+        the data was fetched), otherwise with the current time."""
+        now = time.time()
+        as_of = closes.attrs.get("as_of", {})
+        rows = []
+        tickers = []
+        for ticker in closes:
+            s = closes[ticker].dropna()
+            if s.empty:
+                continue
+            tickers.append(ticker)
+            rows.extend((ticker, d.strftime("%Y-%m-%d"), float(v)) for d, v in s.items())
+        if not tickers:
+            return 0
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.executemany("DELETE FROM closes WHERE ticker = ?", [(t,) for t in tickers])
+                db.executemany("INSERT INTO closes (ticker, date, close) VALUES (?, ?, ?)", rows)
+                db.executemany(
+                    "INSERT OR REPLACE INTO published (ticker, published_at) VALUES (?, ?)",
+                    [(t, as_of.get(t) or now) for t in tickers],
+                )
+        return len(tickers)
+
+    def ages(self, tickers=None):
+        """``{ticker: seconds since it was published}``."""
+        if not os.path.exists(self.path):
+            return {}
+        with self._lock:
+            rows = self._conn().execute("SELECT ticker, published_at FROM published").fetchall()
+        now = time.time()
+        wanted = None if tickers is None else set(tickers)
+        return {t: now - at for t, at in rows if wanted is None or t in wanted}
+
+    def read(self, tickers, max_age=SNAPSHOT_MAX_AGE):
+        """Closes (dates x tickers) for the requested tickers published within
+        ``max_age`` seconds; stale or missing tickers are left out."""
+        fresh = [t for t, age in self.ages(tickers).items() if age <= max_age]
+        if not fresh:
+            return pd.DataFrame()
+        marks = ", ".join("?" for _ in fresh)
+        with self._lock:
+            rows = self._conn().execute(
+                f"SELECT ticker, date, close FROM closes WHERE ticker IN ({marks})", fresh
+            ).fetchall()
+        if not rows:
+            return pd.DataFrame()
+        df = pd.DataFrame(rows, columns=["ticker", "date", "close"])
+        df["date"] = pd.to_datetime(df["date"])
+        frame = df.pivot(index="date", columns="ticker", values="close").sort_index()
+        frame.index.name = "Date"
+        frame.columns.name = None
+        return frame
+
+
+def main():
+    """Standalone publisher, for running the dashboard without the bot."""
+    import json
+
+    import quotes
+    import ratematrix
+
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    pairs_file = os.environ.get("PAIRS_FILE", "pairs.json")
+    while True:
+        with open(pairs_file) as f:
+            pairs = json.load(f)
+        tickers = set(pairs.values()) | ratematrix.direct_quote_tickers()
+        try:
+            n = quotes.publish_snapshot(tickers)
+            logger.info(f"Published snapshot of {n} tickers")
+        except Exception as e:
+            logger.warning(f"Snapshot publish failed: {e}")
+        time.sleep(SNAPSHOT_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
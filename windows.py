@@ -0,0 +1,136 @@
+"""Rolling high/low statistics for every tracked pair.
+
+``window_stats`` takes a dates x pairs close matrix and computes the
+window high, low, prior-window high (all bars but the latest) and
+percent-of-high for all pairs in one vectorized NumPy pass.
+
+``WindowEngine`` keeps the same numbers up to date incrementally: each pair
+has monotonic deques for its running max and min, so a new bar costs O(1)
+amortized instead of a rescan of the window. The latest bar is held apart
+from the deques because today's bar keeps changing until the day closes.
+"""
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from historystore import period_start
+
+WINDOW_PERIOD = "2mo"
+
+
+def window_stats(closes):
+    """``{pair: {"last", "high", "low", "prior_high", "pct_of_high"}}`` for
+    every column of ``closes`` (None for pairs without data)."""
+    if closes is None or closes.empty:
+        return {c: None for c in getattr(closes, "columns", [])}
+    values = closes.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    has_data = valid.any(axis=0)
+    cols = np.arange(values.shape[1])
+
+    last_idx = values.shape[0] - 1 - np.argmax(valid[::-1], axis=0)
+    last = values[last_idx, cols]
+
+    filled_hi = np.where(valid, values, -np.inf)
+    filled_lo = np.where(valid, values, np.inf)
+    high = filled_hi.max(axis=0)
+    low = filled_lo.min(axis=0)
+    prior = filled_hi.copy()
+    prior[last_idx, cols] = -np.inf
+    prior_high = prior.max(axis=0)
+    prior_high = np.where(np.isfinite(prior_high), prior_high, high)
+    pct = np.divide(last * 100, high, out=np.full_like(last, np.nan), where=high > 0)
+
+    stats = {}
+    for i, pair in enumerate(closes.columns):
+        if not has_data[i]:
+            stats[pair] = None
+            continue
+        stats[pair] = {
+            "last": float(last[i]),
+            "high": float(high[i]),
+            "low": float(low[i]),
+            "prior_high": float(prior_high[i]),
+            "pct_of_high": float(pct[i]),
+        }
+    return stats
+
+
+class RollingWindow:
+    """Trailing-window max/min for one pair via monotonic deques."""
+
+    def __init__(self, period=WINDOW_PERIOD):
+        self.period = period
+        self._max = deque()  # (date, value), values strictly decreasing
+        self._min = deque()  # (date, value), values strictly increasing
+        self.current = None  # (date, value) of the latest, still-moving bar
+
+    def push(self, date, value):
+        """Adds a bar, or revises the latest one if ``date`` is the same day."""
+        if np.isnan(value):
+            return
+        if self.current is not None:
+            if date < self.current[0]:
+                return
+            if date > self.current[0]:
+                self._commit(*self.current)
+        self.current = (date, float(value))
+        cutoff = period_start(self.period, today=date)
+        while self._max and self._max[0][0] < cutoff:
+            self._max.popleft()
+        while self._min and self._min[0][0] < cutoff:
+            self._min.popleft()
+
+    def _commit(self, date, value):
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((date, value))
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((date, value))
+
+    def stats(self):
+        if self.current is None:
+            return None
+        last = self.current[1]
+        prior_high = self._max[0][1] if self._max else last
+        high = max(prior_high, last)
+        low = min(self._min[0][1], last) if self._min else last
+        return {
+            "last": last,
+            "high": high,
+            "low": low,
+            "prior_high": prior_high,
+            "pct_of_high": last / high * 100 if high > 0 else float("nan"),
+        }
+
+
+class WindowEngine:
+    """Per-pair RollingWindows, fed only the bars each pair hasn't seen yet."""
+
+    def __init__(self, period=WINDOW_PERIOD):
+        self.period = period
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def sync(self, closes_by_pair):
+        """Feeds ``{pair: close series}``; bars older than the pair's latest
+        bar are skipped, so repeated syncs of the same window are cheap."""
+        with self._lock:
+            for pair, s in closes_by_pair.items():
+                if s is None:
+                    continue
+                w = self._windows.setdefault(pair, RollingWindow(self.period))
+                if w.current is not None:
+                    s = s[s.index >= w.current[0]]
+                for date, value in zip(s.index, s.to_numpy(dtype=float)):
+                    w.push(pd.Timestamp(date), value)
+
+    def stats(self, pairs):
+        with self._lock:
+            return {
+                p: self._windows[p].stats() if p in self._windows else None
+                for p in pairs
+            }
@@ -0,0 +1,221 @@
+"""Durable write-behind queue for rows appended to the Trades sheet(s).
+
+``enqueue`` spools the row to a local JSONL file (fsynced) and returns at
+once; a background thread coalesces everything pending into one
+``append_rows`` call per worksheet. Failed flushes are retried with
+exponential backoff, and rows stay in the spool until Sheets confirms the
+append, so a crash or outage never loses a trade.
+
+When an append may have landed even though it raised (a timeout or 5xx), or
+when rows are left over from a previous process, the next attempt first
+reads the tail of the sheet and skips rows that are already there, so
+retries don't duplicate trades.
+"""
+import os
+import json
+import math
+import time
+import uuid
+import logging
+import threading
+
+import gspread
+import requests
+
+import sheets
+
+logger = logging.getLogger(__name__)
+
+TRADE_SPOOL = os.environ.get("TRADE_SPOOL", "trade_spool.jsonl")
+TRADE_FLUSH_DELAY = float(os.environ.get("TRADE_FLUSH_DELAY", 2))
+RETRY_BASE = 2
+RETRY_MAX = 300
+# Extra rows read above the expected position when checking for duplicates,
+# in case other writers appended in between.
+TAIL_MARGIN = 50
+
+
+def _is_rejected(exc):
+    """True if Sheets definitely did not apply the write (quota / bad request).
+    Timeouts, dropped connections and 5xx errors are ambiguous."""
+    if isinstance(exc, gspread.exceptions.APIError):
+        code = getattr(exc.response, "status_code", None)
+        return code is not None and 400 <= int(code) < 500
+    return isinstance(exc, requests.exceptions.ConnectTimeout)
+
+
+def _same_trade(sheet_row, row):
+    """Compares Date/From/To/Amount/Rate of a sheet row and a spooled row."""
+    if len(sheet_row) < 5:
+        return False
+    if [str(v) for v in sheet_row[:3]] != [str(v) for v in row[:3]]:
+        return False
+    try:
+        return all(
+            math.isclose(float(str(a).replace(",", "")), float(b), rel_tol=1e-9)
+            for a, b in zip(sheet_row[3:5], row[3:5])
+        )
+    except (TypeError, ValueError):
+        return False
+
+
+class WriteQueue:
+    def __init__(self, path=TRADE_SPOOL, on_flush=None):
+        self.path = path
+        self.on_flush = on_flush  # called with the worksheet title after each append
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pending = self._load()
+        # Rows that may already be in the sheet: everything left over from a
+        # previous process, plus anything whose append failed ambiguously.
+        self._uncertain = {e["id"] for e in self._pending}
+        if self._pending:
+            logger.info(f"Recovered {len(self._pending)} unflushed trade rows from {path}")
+            self._wake.set()
+
+    # --------------- Spool file ---------------
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    logger.error(f"Skipping corrupt spool line in {self.path}: {line[:80]}")
+        return entries
+
+    def _append_spool(self, entries):
+        with open(self.path, "a") as f:
+            for e in entries:
+                f.write(json.dumps(e) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite_spool(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            for e in self._pending:
+                f.write(json.dumps(e) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    # --------------- Public API ---------------
+
+    def enqueue(self, sheet, row):
+        return self.enqueue_many(sheet, [row])[0]
+
+    def enqueue_many(self, sheet, rows):
+        """Durably spools ``rows`` for ``sheet`` and schedules a flush; returns their ids."""
+        entries = [{"id": uuid.uuid4().hex, "sheet": sheet, "row": list(r)} for r in rows]
+        with self._lock:
+            self._append_spool(entries)
+            self._pending.extend(entries)
+        self._wake.set()
+        return [e["id"] for e in entries]
+
+    def pending(self, sheet=None):
+        with self._lock:
+            return [e["row"] for e in self._pending if sheet is None or e["sheet"] == sheet]
+
+    def start(self):
+        """Starts the background flusher thread (idempotent)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trade-writer", daemon=True)
+            self._thread.start()
+
+    def flush(self):
+        """Appends everything pending, one ``append_rows`` per worksheet.
+
+        Returns True when the queue is empty afterwards, False if some
+        worksheet failed (its rows stay spooled for the next attempt).
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            by_sheet = {}
+            for e in batch:
+                by_sheet.setdefault(e["sheet"], []).append(e)
+
+            ok = True
+            for sheet, entries in by_sheet.items():
+                try:
+                    self._flush_sheet(sheet, entries)
+                except Exception as e:
+                    ok = False
+                    if not _is_rejected(e):
+                        self._uncertain.update(x["id"] for x in entries)
+                    logger.warning(f"Flushing {len(entries)} rows to {sheet} failed: {e}")
+            with self._lock:
+                return ok and not self._pending
+
+    def drain(self, timeout=None):
+        """Flushes with backoff until the queue is empty (or ``timeout`` passes)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = RETRY_BASE
+        while not self.flush():
+            if deadline is not None and time.monotonic() + delay > deadline:
+                return False
+            time.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX)
+        return True
+
+    # --------------- Internals ---------------
+
+    def _flush_sheet(self, sheet, entries):
+        ws = sheets.worksheet(sheet, sheets.TRADES_HEADER, rows=1000, cols=10)
+        if any(e["id"] in self._uncertain for e in entries):
+            entries = self._skip_written(ws, entries)
+        if entries:
+            ws.append_rows([e["row"] for e in entries], value_input_option="RAW")
+        self._done(sheet, entries)
+
+    def _skip_written(self, ws, entries):
+        """Drops entries whose rows already appear at the end of the sheet."""
+        filled = len(ws.col_values(1))
+        start = max(filled - len(entries) - TAIL_MARGIN + 1, 2)
+        tail = ws.get(f"A{start}:E{filled}") if filled >= start else []
+        written = []
+        remaining = []
+        for e in entries:
+            match = next((i for i, r in enumerate(tail) if _same_trade(r, e["row"])), None)
+            if match is None:
+                remaining.append(e)
+            else:
+                tail.pop(match)
+                written.append(e)
+        if written:
+            logger.info(f"{len(written)} spooled rows were already in {ws.title}; not re-appending")
+            self._done(ws.title, written)
+        return remaining
+
+    def _done(self, sheet, entries):
+        if not entries:
+            return
+        ids = {e["id"] for e in entries}
+        with self._lock:
+            self._pending = [e for e in self._pending if e["id"] not in ids]
+            self._rewrite_spool()
+        self._uncertain -= ids
+        if self.on_flush:
+            self.on_flush(sheet)
+
+    def _run(self):
+        delay = 0
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            time.sleep(max(delay, TRADE_FLUSH_DELAY))  # let concurrent trades coalesce
+            if self.flush():
+                delay = 0
+            else:
+                delay = min(max(delay * 2, RETRY_BASE), RETRY_MAX)
+                self._wake.set()